@@ -0,0 +1,83 @@
+# File: bench/common.py
+# Reminder to self: Shared bits for the benchmark scripts. The app modules read their settings from the
+# environment when they're imported, so every script sets up env vars first and only then imports them.
+
+import json
+import os
+import platform
+import subprocess
+import sys
+from datetime import datetime, timezone
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+API_DIR = os.path.join(REPO_ROOT, "luna_api")
+RESULTS_DIR = os.path.join(REPO_ROOT, "bench_results")
+
+# Reminder to self: Seeded users all share this password, so load tests can log in as any of them.
+BENCH_PASSWORD = "luna-bench-password"
+
+# A spread of real cities, plus a few made-up ones so the negative cache gets exercised too.
+CITIES = [
+    "London", "Paris", "Tokyo", "New York", "Berlin", "Madrid", "Rome", "Toronto", "Sydney", "Cairo",
+    "Lagos", "Nairobi", "Mumbai", "Delhi", "Beijing", "Shanghai", "Seoul", "Bangkok", "Jakarta", "Manila",
+    "Mexico City", "Sao Paulo", "Buenos Aires", "Lima", "Bogota", "Santiago", "Chicago", "Los Angeles", "Miami", "Seattle",
+    "Dublin", "Lisbon", "Vienna", "Prague", "Warsaw", "Stockholm", "Oslo", "Helsinki", "Copenhagen", "Amsterdam",
+    "Brussels", "Zurich", "Athens", "Istanbul", "Dubai", "Riyadh", "Tehran", "Karachi", "Dhaka", "Hanoi",
+]
+UNKNOWN_CITIES = ["Atlantis", "El Dorado", "Narnia"]
+
+
+def use_luna_api():
+    """Makes `import main`, `import nudges` etc. work the same way they do inside the container."""
+    if API_DIR not in sys.path:
+        sys.path.insert(0, API_DIR)
+
+
+def bench_email(i: int) -> str:
+    return f"bench-{i}@luna.test"
+
+
+def city_for(i: int, unknown_every: int = 0) -> str:
+    if unknown_every and i % unknown_every == 0:
+        return UNKNOWN_CITIES[i % len(UNKNOWN_CITIES)]
+    return CITIES[i % len(CITIES)]
+
+
+def percentiles(samples: list) -> dict:
+    """p50/p95/p99/max in milliseconds from a list of durations in seconds."""
+    if not samples:
+        return {"p50_ms": None, "p95_ms": None, "p99_ms": None, "max_ms": None}
+    ordered = sorted(samples)
+
+    def pick(q):
+        return round(ordered[min(len(ordered) - 1, int(q * len(ordered)))] * 1000, 3)
+
+    return {"p50_ms": pick(0.50), "p95_ms": pick(0.95), "p99_ms": pick(0.99), "max_ms": round(ordered[-1] * 1000, 3)}
+
+
+def git_commit() -> str:
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], cwd=REPO_ROOT, text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def write_results(name: str, results: dict, output: str = None) -> str:
+    """Writes results plus enough context (commit, database, machine) to compare runs later."""
+    report = {
+        "benchmark": name,
+        "commit": git_commit(),
+        "timestamp": datetime.now(timezone.utc).isoformat(),
+        "database": (os.getenv("DATABASE_URL") or "").split("://")[0],
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "cpus": os.cpu_count(),
+        "results": results,
+    }
+    if output is None:
+        os.makedirs(RESULTS_DIR, exist_ok=True)
+        output = os.path.join(RESULTS_DIR, f"{name}-{report['commit']}.json")
+    with open(output, "w") as f:
+        json.dump(report, f, indent=2, sort_keys=True)
+    print(f"Results written to {output}")
+    return output
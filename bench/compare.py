@@ -0,0 +1,53 @@
+# File: bench/compare.py
+# Reminder to self: Side-by-side diff of two result files, e.g. before and after a change.
+#
+#   python bench/compare.py bench_results/load-abc123.json bench_results/load-def456.json
+
+import argparse
+import json
+
+# Reminder to self: For these, smaller is better. For everything else (throughput etc.), bigger is better.
+LOWER_IS_BETTER = ("_ms", "_seconds", "error_rate", "upstream_requests", "cities_failed")
+
+
+def flatten(data, prefix: str = "") -> dict:
+    flat = {}
+    for key, value in data.items():
+        path = f"{prefix}.{key}" if prefix else key
+        if isinstance(value, dict):
+            flat.update(flatten(value, path))
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            flat[path] = value
+    return flat
+
+
+def compare(before: dict, after: dict, threshold: float) -> list:
+    old, new = flatten(before["results"]), flatten(after["results"])
+    rows = []
+    for path in sorted(old.keys() & new.keys()):
+        a, b = old[path], new[path]
+        if a == b:
+            continue
+        change = (b - a) / a if a else float("inf")
+        if abs(change) < threshold:
+            continue
+        better = (b < a) if path.endswith(LOWER_IS_BETTER) else (b > a)
+        rows.append((path, a, b, change, "better" if better else "worse"))
+    return rows
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare two benchmark result files")
+    parser.add_argument("before")
+    parser.add_argument("after")
+    parser.add_argument("--threshold", type=float, default=0.05, help="hide changes smaller than this fraction")
+    args = parser.parse_args()
+
+    with open(args.before) as f:
+        before = json.load(f)
+    with open(args.after) as f:
+        after = json.load(f)
+
+    print(f"{before['benchmark']}: {before['commit']} -> {after['commit']}")
+    for path, a, b, change, verdict in compare(before, after, args.threshold):
+        print(f"  {path:<60} {a:>12} -> {b:>12}  ({change:+.1%}, {verdict})")
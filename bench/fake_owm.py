@@ -0,0 +1,106 @@
+# File: bench/fake_owm.py
+# Reminder to self: A local stand-in for OpenWeatherMap, so benchmarks don't depend on the real API
+# (or burn our quota). Point the app at it with OPENWEATHER_BASE_URL=http://127.0.0.1:<port>.
+#
+#   python bench/fake_owm.py --port 8090 --latency-ms 80 --jitter-ms 40 --error-rate 0.01
+
+import argparse
+import json
+import random
+import threading
+import time
+import zlib
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+from common import UNKNOWN_CITIES
+
+CONDITIONS = ["Clear", "Clouds", "Rain", "Drizzle", "Snow", "Mist", "Thunderstorm"]
+
+
+def fake_weather(city: str) -> dict:
+    """Same city always gets the same weather, so runs are comparable."""
+    seed = zlib.crc32(city.casefold().encode())
+    return {
+        "name": city,
+        "main": {"temp": round(-5 + (seed % 4000) / 100, 1), "humidity": seed % 100},
+        "weather": [{"main": CONDITIONS[seed % len(CONDITIONS)]}],
+    }
+
+
+class FakeOWMHandler(BaseHTTPRequestHandler):
+    # Set by make_server()
+    latency_ms = 0.0
+    jitter_ms = 0.0
+    error_rate = 0.0
+    stats = None
+    stats_lock = None
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        if url.path != "/data/2.5/weather":
+            return self._reply(404, {"cod": "404", "message": "not found"})
+
+        delay = self.latency_ms + random.uniform(-self.jitter_ms, self.jitter_ms)
+        if delay > 0:
+            time.sleep(delay / 1000)
+
+        city = parse_qs(url.query).get("q", [""])[0]
+        with self.stats_lock:
+            self.stats["requests"] += 1
+        if random.random() < self.error_rate:
+            with self.stats_lock:
+                self.stats["errors"] += 1
+            return self._reply(503, {"cod": "503", "message": "simulated outage"})
+        if not city or city.casefold() in {c.casefold() for c in UNKNOWN_CITIES}:
+            return self._reply(404, {"cod": "404", "message": "city not found"})
+        return self._reply(200, fake_weather(city))
+
+    def _reply(self, status: int, body: dict):
+        payload = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def log_message(self, format, *args):
+        pass  # Way too noisy under load
+
+
+def make_server(port: int = 0, latency_ms: float = 0.0, jitter_ms: float = 0.0, error_rate: float = 0.0) -> ThreadingHTTPServer:
+    handler = type("Handler", (FakeOWMHandler,), {
+        "latency_ms": latency_ms, "jitter_ms": jitter_ms, "error_rate": error_rate,
+        "stats": {"requests": 0, "errors": 0}, "stats_lock": threading.Lock(),
+    })
+    server = ThreadingHTTPServer(("127.0.0.1", port), handler)
+    server.daemon_threads = True
+    return server
+
+
+def start_in_background(**kwargs) -> ThreadingHTTPServer:
+    """Starts the fake server on a thread. server.server_address[1] is the port, server.RequestHandlerClass.stats the counters."""
+    server = make_server(**kwargs)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def base_url(server: ThreadingHTTPServer) -> str:
+    return f"http://127.0.0.1:{server.server_address[1]}"
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Fake OpenWeatherMap for benchmarks")
+    parser.add_argument("--port", type=int, default=8090)
+    parser.add_argument("--latency-ms", type=float, default=50.0)
+    parser.add_argument("--jitter-ms", type=float, default=0.0)
+    parser.add_argument("--error-rate", type=float, default=0.0, help="fraction of requests answered with a 503")
+    args = parser.parse_args()
+
+    server = make_server(args.port, args.latency_ms, args.jitter_ms, args.error_rate)
+    print(f"Fake OpenWeatherMap listening on {base_url(server)} "
+          f"(latency {args.latency_ms}±{args.jitter_ms}ms, error rate {args.error_rate})")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
@@ -0,0 +1,121 @@
+# File: bench/load.py
+# Reminder to self: Load scenarios against a running API. Seed the database first (bench/seed.py) and start
+# the API pointed at the fake weather server, e.g.
+#
+#   python bench/fake_owm.py --port 8090 --latency-ms 80 &
+#   DATABASE_URL=sqlite:///bench.db python bench/seed.py --guardians 2000 --whispers 50 --reset
+#   DATABASE_URL=sqlite:///bench.db OPENWEATHER_BASE_URL=http://127.0.0.1:8090 uvicorn main:app --app-dir luna_api --port 8000 &
+#   python bench/load.py --base-url http://127.0.0.1:8000 --guardians 2000 --concurrency 50 --duration 20
+
+import argparse
+import asyncio
+import random
+import time
+import uuid
+
+import httpx
+
+from common import BENCH_PASSWORD, CITIES, bench_email, percentiles, write_results
+
+SCENARIOS = ["signup", "login", "recommendation", "nudges", "preferences"]
+
+
+async def login(client: httpx.AsyncClient, email: str) -> str:
+    response = await client.post("/login", data={"username": email, "password": BENCH_PASSWORD})
+    response.raise_for_status()
+    return response.json()["access_token"]
+
+
+def make_request(scenario: str, client: httpx.AsyncClient, rng: random.Random, guardians: int, tokens: list, run_id: str):
+    """Returns the coroutine for one request of the given scenario."""
+    if scenario == "signup":
+        email = f"load-{run_id}-{uuid.uuid4().hex[:12]}@luna.test"
+        return client.post("/signup", json={"email": email, "password": BENCH_PASSWORD, "location": rng.choice(CITIES)})
+    if scenario == "login":
+        return client.post("/login", data={"username": bench_email(rng.randint(1, guardians)), "password": BENCH_PASSWORD})
+
+    headers = {"Authorization": f"Bearer {rng.choice(tokens)}"}
+    if scenario == "recommendation":
+        return client.get("/recommendation", params={"gender": "unisex"}, headers=headers)
+    if scenario == "nudges":
+        return client.get("/nudges", params={"limit": 50}, headers=headers)
+    if scenario == "preferences":
+        return client.patch("/preferences", json={"location": rng.choice(CITIES)}, headers=headers)
+    raise ValueError(f"Unknown scenario {scenario}")
+
+
+async def run_scenario(scenario: str, client: httpx.AsyncClient, concurrency: int, duration: float,
+                       guardians: int, tokens: list, run_id: str) -> dict:
+    latencies, statuses = [], {}
+    deadline = time.perf_counter() + duration
+
+    async def worker(worker_id: int):
+        rng = random.Random(f"{run_id}-{scenario}-{worker_id}")
+        while time.perf_counter() < deadline:
+            started = time.perf_counter()
+            try:
+                response = await make_request(scenario, client, rng, guardians, tokens, run_id)
+                status = str(response.status_code)
+            except httpx.HTTPError as e:
+                status = type(e).__name__
+            latencies.append(time.perf_counter() - started)
+            statuses[status] = statuses.get(status, 0) + 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker(i) for i in range(concurrency)))
+    elapsed = time.perf_counter() - started
+
+    ok = sum(count for status, count in statuses.items() if status.startswith("2"))
+    return {
+        "requests": len(latencies),
+        "ok": ok,
+        "error_rate": round(1 - ok / len(latencies), 4) if latencies else None,
+        "throughput_rps": round(len(latencies) / elapsed, 1),
+        "statuses": statuses,
+        **percentiles(latencies),
+    }
+
+
+async def main(args) -> dict:
+    limits = httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=args.concurrency)
+    async with httpx.AsyncClient(base_url=args.base_url, limits=limits, timeout=args.timeout) as client:
+        # Log in a pool of seeded users up front so the token-based scenarios don't measure bcrypt.
+        rng = random.Random(args.seed)
+        emails = [bench_email(rng.randint(1, args.guardians)) for _ in range(args.token_pool)]
+        # A few at a time, so we don't trip the server's password-hashing backpressure before we've even started.
+        gate = asyncio.Semaphore(4)
+
+        async def gated_login(email):
+            async with gate:
+                return await login(client, email)
+
+        tokens = await asyncio.gather(*(gated_login(email) for email in emails))
+
+        run_id = uuid.uuid4().hex[:8]
+        results = {"base_url": args.base_url, "concurrency": args.concurrency, "duration_seconds": args.duration, "scenarios": {}}
+        for scenario in args.scenarios:
+            result = await run_scenario(scenario, client, args.concurrency, args.duration, args.guardians, tokens, run_id)
+            results["scenarios"][scenario] = result
+            print(f"{scenario:>15}: {result['throughput_rps']:>8} req/s  p50 {result['p50_ms']}ms  "
+                  f"p95 {result['p95_ms']}ms  p99 {result['p99_ms']}ms  statuses {result['statuses']}")
+
+        stats = await client.get("/stats")
+        if stats.status_code == 200:
+            results["server_stats"] = stats.json()
+        return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run load scenarios against a running L.U.N.A. API")
+    parser.add_argument("--base-url", default="http://127.0.0.1:8000")
+    parser.add_argument("--guardians", type=int, default=1000, help="how many guardians bench/seed.py created")
+    parser.add_argument("--scenarios", nargs="+", choices=SCENARIOS, default=SCENARIOS)
+    parser.add_argument("--concurrency", type=int, default=20)
+    parser.add_argument("--duration", type=float, default=10.0, help="seconds per scenario")
+    parser.add_argument("--token-pool", type=int, default=50, help="seeded users to log in as for authenticated scenarios")
+    parser.add_argument("--timeout", type=float, default=30.0)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--output", default=None)
+    args = parser.parse_args()
+
+    write_results("load", asyncio.run(main(args)), args.output)
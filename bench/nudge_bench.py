@@ -0,0 +1,73 @@
+# File: bench/nudge_bench.py
+# Reminder to self: Microbenchmark for the nudge job at different guardian counts. Each size gets a freshly
+# seeded database and runs the job twice: cold (empty weather cache) and warm (cache already filled).
+#
+#   python bench/nudge_bench.py --sizes 1000 10000 100000 --latency-ms 50
+#
+# By default every size gets its own SQLite file in a temp directory. To use Postgres instead, pass
+# --database-url and --wipe (its tables get dropped and recreated for every size).
+
+import argparse
+import os
+import tempfile
+import time
+
+from common import use_luna_api, write_results
+from fake_owm import base_url, start_in_background
+
+parser = argparse.ArgumentParser(description="Benchmark the nudge job")
+parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000, 100000])
+parser.add_argument("--latency-ms", type=float, default=50.0, help="fake OpenWeatherMap latency")
+parser.add_argument("--error-rate", type=float, default=0.0)
+parser.add_argument("--unknown-every", type=int, default=0, help="every Nth guardian lives in a city that doesn't exist")
+parser.add_argument("--database-url", default=None, help="scratch database to use instead of temp SQLite files")
+parser.add_argument("--wipe", action="store_true", help="confirm that --database-url may be wiped")
+parser.add_argument("--output", default=None)
+args = parser.parse_args()
+
+if args.database_url and not args.wipe:
+    parser.error("--database-url gets its tables dropped for every size; pass --wipe if that's really OK")
+
+# The app reads these when it's imported, so they have to be set first.
+fake_server = start_in_background(latency_ms=args.latency_ms, error_rate=args.error_rate)
+os.environ["OPENWEATHER_BASE_URL"] = base_url(fake_server)
+os.environ.setdefault("OPENWEATHER_API_KEY", "bench")
+scratch_dir = tempfile.mkdtemp(prefix="luna-bench-")
+os.environ["DATABASE_URL"] = args.database_url or f"sqlite:///{os.path.join(scratch_dir, 'import.db')}"
+use_luna_api()
+
+from sqlmodel import create_engine  # noqa: E402
+
+import nudges  # noqa: E402
+import seed  # noqa: E402
+import weather  # noqa: E402
+
+
+def run_once(engine) -> dict:
+    upstream = fake_server.RequestHandlerClass.stats
+    before = upstream["requests"]
+    stats = nudges.run_nudge_job(engine)
+    result = stats.as_dict()
+    result["upstream_requests"] = upstream["requests"] - before
+    result["whispers_per_second"] = round(stats.whispers_written / stats.wall_time_seconds, 1) if stats.wall_time_seconds else None
+    return result
+
+
+results = {"fake_owm_latency_ms": args.latency_ms, "error_rate": args.error_rate, "sizes": {}}
+for size in args.sizes:
+    url = args.database_url or f"sqlite:///{os.path.join(scratch_dir, f'nudges-{size}.db')}"
+    engine = create_engine(url)
+    seed.reset(engine)
+    seeded = seed.seed(engine, size, unknown_every=args.unknown_every, habit_fraction=0)
+
+    weather.provider.clear()
+    started = time.perf_counter()
+    cold = run_once(engine)
+    warm = run_once(engine)
+    results["sizes"][str(size)] = {"seed": seeded, "cold": cold, "warm": warm}
+    print(f"{size:>7} guardians: cold {cold['wall_time_seconds']}s ({cold['upstream_requests']} upstream calls), "
+          f"warm {warm['wall_time_seconds']}s, total {time.perf_counter() - started:.1f}s")
+    engine.dispose()
+
+write_results("nudge_job", results, args.output)
+fake_server.shutdown()
@@ -0,0 +1,104 @@
+# File: bench/seed.py
+# Reminder to self: Fills a database with N fake guardians (plus habits and whispers) for benchmarks.
+# Uses whatever DATABASE_URL points at, e.g.
+#
+#   DATABASE_URL=sqlite:///bench.db python bench/seed.py --guardians 10000 --whispers 20 --reset
+
+import argparse
+import random
+import time
+from datetime import datetime, timedelta
+
+from common import BENCH_PASSWORD, bench_email, city_for, use_luna_api
+
+use_luna_api()
+
+from sqlalchemy import func, insert, select, text  # noqa: E402
+
+import auth  # noqa: E402
+import habits  # noqa: E402
+import models  # noqa: E402
+
+BATCH_SIZE = 5000
+
+
+def reset(engine):
+    models.SQLModel.metadata.drop_all(engine)
+    models.SQLModel.metadata.create_all(engine)
+
+
+def seed(engine, guardians: int, whispers_per_guardian: int = 0, habit_fraction: float = 0.3,
+         unknown_every: int = 0, nudge_fraction: float = 1.0, rng_seed: int = 42) -> dict:
+    """
+    Inserts guardians bench-1@luna.test .. bench-N@luna.test, all with BENCH_PASSWORD.
+    Returns how many rows went in and how long it took.
+    """
+    rng = random.Random(rng_seed)
+    started = time.perf_counter()
+    # bcrypt is slow on purpose, so hash once and share it.
+    hashed_password = auth.pwd_context.hash(BENCH_PASSWORD)
+    now = datetime.utcnow()
+
+    # New guardians get explicit ids after the current highest one, so their whispers can point at them.
+    with engine.begin() as connection:
+        first_id = 1 + (connection.execute(select(func.max(models.Guardian.id))).scalar() or 0)
+
+    whisper_count = 0
+    for start in range(0, guardians, BATCH_SIZE):
+        rows, whisper_rows = [], []
+        for i in range(start + 1, min(start + BATCH_SIZE, guardians) + 1):
+            guardian_habits = None
+            if rng.random() < habit_fraction:
+                guardian_habits = {"water": {"enabled": True, "interval_hours": rng.choice([1, 2, 4])}}
+            guardian_id = first_id + i - 1
+            rows.append({
+                "id": guardian_id,
+                "email": bench_email(guardian_id),
+                "hashed_password": hashed_password,
+                "location": city_for(i, unknown_every),
+                "enable_nudges": rng.random() < nudge_fraction,
+                "habits": guardian_habits,
+                "created_at": now,
+            })
+            for _ in range(whispers_per_guardian):
+                whisper_rows.append({
+                    "guardian_id": guardian_id,
+                    "message": "Seeded whisper for benchmarks.",
+                    "created_at": now - timedelta(minutes=rng.randint(0, 60 * 24 * 30)),
+                })
+        with engine.begin() as connection:
+            connection.execute(insert(models.Guardian), rows)
+            for chunk in range(0, len(whisper_rows), BATCH_SIZE):
+                connection.execute(insert(models.Whisper), whisper_rows[chunk:chunk + BATCH_SIZE])
+        whisper_count += len(whisper_rows)
+
+    if engine.dialect.name == "postgresql":
+        # We picked the ids ourselves, so move the sequence past them or the next /signup would collide.
+        with engine.begin() as connection:
+            connection.execute(text("SELECT setval(pg_get_serial_sequence('guardian', 'id'), (SELECT max(id) FROM guardian))"))
+
+    synced = habits.rebuild_index(engine)
+    return {
+        "guardians": guardians,
+        "whispers": whisper_count,
+        "guardians_with_habits": synced,
+        "seconds": round(time.perf_counter() - started, 3),
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Seed the database with fake guardians")
+    parser.add_argument("--guardians", type=int, default=1000)
+    parser.add_argument("--whispers", type=int, default=0, help="whispers per guardian")
+    parser.add_argument("--habit-fraction", type=float, default=0.3)
+    parser.add_argument("--unknown-every", type=int, default=0, help="every Nth guardian lives in a city that doesn't exist")
+    parser.add_argument("--reset", action="store_true", help="drop and recreate all tables first")
+    args = parser.parse_args()
+
+    from database import engine
+
+    if args.reset:
+        reset(engine)
+    else:
+        models.SQLModel.metadata.create_all(engine)
+    print(seed(engine, args.guardians, args.whispers, args.habit_fraction, args.unknown_every))
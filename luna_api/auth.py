@@ -1,15 +1,24 @@
 # File: luna_api/auth.py
 
+import asyncio
 import os
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
 from datetime import datetime, timedelta, timezone
-from typing import Optional
+from typing import Optional, Tuple
 
 from fastapi import Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer
 from jose import JWTError, jwt
 from passlib.context import CryptContext
-from sqlmodel import Session, select
+from sqlmodel import select
+from sqlmodel.ext.asyncio.session import AsyncSession
 
+import config
+import metrics
 import models  # <-- FIX #1: Add this missing import
 from database import get_session
 
@@ -19,40 +28,286 @@ ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = 30
 
 # --- Hashing ---
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+# Reminder to self: min/max desired rounds pinned to BCRYPT_ROUNDS means any hash made with a different cost
+# gets flagged for an upgrade, and login quietly rehashes it.
+pwd_context = CryptContext(
+    schemes=["bcrypt"],
+    deprecated="auto",
+    bcrypt__default_rounds=config.BCRYPT_ROUNDS,
+    bcrypt__min_desired_rounds=config.BCRYPT_ROUNDS,
+    bcrypt__max_desired_rounds=config.BCRYPT_ROUNDS,
+)
 
-def verify_password(plain: str, hashed: str) -> bool:
-    return pwd_context.verify(plain, hashed)
+class HashingPool:
+    """
+    A small, dedicated thread pool for bcrypt. At most workers + queue_size hashes can be in flight;
+    anything beyond that gets a fast 503 instead of queueing up behind everyone else.
+    """
 
-def get_password_hash(password: str) -> str:
-    return pwd_context.hash(password)
+    def __init__(self, workers: int = config.HASH_WORKERS, queue_size: int = config.HASH_QUEUE_SIZE,
+                 timeout_seconds: float = config.HASH_TIMEOUT_SECONDS):
+        self.timeout_seconds = timeout_seconds
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="bcrypt")
+        self._slots = threading.BoundedSemaphore(workers + queue_size)
+        self._lock = threading.Lock()
+        self.rejected = 0
+        self.timings = {}  # operation -> {"count", "total_seconds", "max_seconds", "queue_seconds"}
+
+    def _record(self, operation: str, queued: float, took: float):
+        with self._lock:
+            timing = self.timings.setdefault(operation, {"count": 0, "total_seconds": 0.0, "max_seconds": 0.0, "queue_seconds": 0.0})
+            timing["count"] += 1
+            timing["total_seconds"] += took
+            timing["max_seconds"] = max(timing["max_seconds"], took)
+            timing["queue_seconds"] += queued
+        metrics.PASSWORD_HASH_SECONDS.observe(took, operation=operation)
+        metrics.PASSWORD_HASH_QUEUE_SECONDS.observe(queued, operation=operation)
+
+    def _timed(self, operation: str, submitted: float, fn, *args):
+        started = time.perf_counter()
+        try:
+            return fn(*args)
+        finally:
+            self._record(operation, started - submitted, time.perf_counter() - started)
+
+    def submit(self, operation: str, fn, *args):
+        """Queues fn on the pool, or raises a 503 straight away if the pool is already full."""
+        if not self._slots.acquire(blocking=False):
+            with self._lock:
+                self.rejected += 1
+            metrics.PASSWORD_HASH_REJECTED.inc()
+            raise HTTPException(
+                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                detail="L.U.N.A. is a little overwhelmed right now. Try again in a second?",
+                headers={"Retry-After": "1"},
+            )
+        future = self._executor.submit(self._timed, operation, time.perf_counter(), fn, *args)
+        future.add_done_callback(lambda _: self._slots.release())
+        return future
+
+    async def run(self, operation: str, fn, *args):
+        """Runs fn on the pool and awaits it, so the event loop stays free while bcrypt grinds."""
+        future = self.submit(operation, fn, *args)
+        try:
+            return await asyncio.wait_for(asyncio.wrap_future(future), timeout=self.timeout_seconds)
+        except asyncio.TimeoutError:
+            raise HTTPException(
+                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                detail="Password check took too long. Try again in a second?",
+                headers={"Retry-After": "1"},
+            )
+
+    def stats(self) -> dict:
+        with self._lock:
+            operations = {
+                name: {
+                    "count": timing["count"],
+                    "avg_seconds": round(timing["total_seconds"] / timing["count"], 4),
+                    "max_seconds": round(timing["max_seconds"], 4),
+                    "avg_queue_seconds": round(timing["queue_seconds"] / timing["count"], 4),
+                }
+                for name, timing in self.timings.items()
+            }
+            return {"rounds": config.BCRYPT_ROUNDS, "rejected": self.rejected, "operations": operations}
+
+hashing_pool = HashingPool()
+
+async def verify_and_rehash(plain: str, hashed: str) -> Tuple[bool, Optional[str]]:
+    """Checks the password and, if the stored hash uses an old cost, also returns a fresh hash to save."""
+    return await hashing_pool.run("verify", pwd_context.verify_and_update, plain, hashed)
+
+async def get_password_hash(password: str) -> str:
+    return await hashing_pool.run("hash", pwd_context.hash, password)
 
 # --- JWT Token Handling ---
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="login")
 
-def create_access_token(data: dict):
+def create_access_token(data: dict, guardian: Optional[models.Guardian] = None):
     to_encode = data.copy()
-    expire = datetime.now(timezone.utc) + timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
-    to_encode.update({"exp": expire})
+    now = datetime.now(timezone.utc)
+    expire = now + timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
+    to_encode.update({"exp": expire, "iat": now})
+    if config.AUTH_EMBED_CLAIMS and guardian is not None:
+        # Reminder to self: Frequently needed claims, so /recommendation can skip the database entirely.
+        to_encode["loc"] = guardian.location
     return jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
 
-# --- The Authentication Dependency ---
-def get_current_guardian(token: str = Depends(oauth2_scheme), session: Session = Depends(get_session)) -> models.Guardian:
-    # <-- FIX #2: Define the exception variable here
-    credentials_exception = HTTPException(
-        status_code=status.HTTP_401_UNAUTHORIZED,
-        detail="Could not validate credentials",
-        headers={"WWW-Authenticate": "Bearer"},
-    )
+# --- Principal Cache ---
+@dataclass
+class Principal:
+    """The bits of a guardian that most endpoints actually need."""
+    id: int
+    location: Optional[str] = None
+
+class PrincipalCache:
+    """
+    Short-TTL, size-bounded LRU of decoded tokens and guardian snapshots.
+    Snapshots are detached copies, so endpoints must treat them as read-only.
+    """
+
+    def __init__(self, ttl_seconds: float = config.AUTH_CACHE_TTL_SECONDS, max_entries: int = config.AUTH_CACHE_SIZE):
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self._tokens: "OrderedDict[str, tuple]" = OrderedDict()  # token -> (expires_at, payload)
+        self._guardians: "OrderedDict[int, tuple]" = OrderedDict()  # guardian id -> (expires_at, snapshot)
+        self._changed: "OrderedDict[int, float]" = OrderedDict()  # guardian id -> when we last invalidated it
+        self._lock = threading.Lock()
+        self.token_hits = 0
+        self.token_misses = 0
+        self.guardian_hits = 0
+        self.guardian_misses = 0
+        self.claim_hits = 0
+        self.invalidations = 0
+
+    def _get(self, store: OrderedDict, key):
+        entry = store.get(key)
+        if entry is None:
+            return None
+        if entry[0] <= time.monotonic():
+            del store[key]
+            return None
+        store.move_to_end(key)
+        return entry[1]
+
+    def _put(self, store: OrderedDict, key, value, ttl: float):
+        store[key] = (time.monotonic() + ttl, value)
+        store.move_to_end(key)
+        while len(store) > self.max_entries:
+            store.popitem(last=False)
+
+    def get_token(self, token: str) -> Optional[dict]:
+        with self._lock:
+            payload = self._get(self._tokens, token)
+            if payload is None:
+                self.token_misses += 1
+            else:
+                self.token_hits += 1
+            return payload
+
+    def put_token(self, token: str, payload: dict):
+        # Never keep a token around longer than it's valid.
+        ttl = min(self.ttl_seconds, payload["exp"] - time.time()) if "exp" in payload else self.ttl_seconds
+        if ttl > 0:
+            with self._lock:
+                self._put(self._tokens, token, payload, ttl)
+
+    def get_guardian(self, guardian_id: int) -> Optional[models.Guardian]:
+        with self._lock:
+            guardian = self._get(self._guardians, guardian_id)
+            if guardian is None:
+                self.guardian_misses += 1
+            else:
+                self.guardian_hits += 1
+            return guardian
+
+    def put_guardian(self, guardian: models.Guardian, read_at: float):
+        """read_at is time.time() from just before the row was SELECTed."""
+        snapshot = models.Guardian(**guardian.model_dump())
+        with self._lock:
+            # Reminder to self: If the guardian changed after we read it, this snapshot is already stale.
+            # Without this check, a slow reader could put it back right after invalidate_guardian().
+            changed_at = self._changed.get(guardian.id)
+            if changed_at is not None and changed_at >= read_at:
+                return
+            self._put(self._guardians, guardian.id, snapshot, self.ttl_seconds)
+
+    def claims_are_fresh(self, guardian_id: int, issued_at: Optional[float]) -> bool:
+        """Claims in a token are only trusted if the guardian hasn't changed since it was issued."""
+        if issued_at is None:
+            return False
+        with self._lock:
+            changed_at = self._changed.get(guardian_id)
+            fresh = changed_at is None or issued_at > changed_at
+            if fresh:
+                self.claim_hits += 1
+            return fresh
+
+    def invalidate_guardian(self, guardian_id: int):
+        """Call this whenever a guardian changes, so nobody gets served the old snapshot."""
+        with self._lock:
+            self._guardians.pop(guardian_id, None)
+            self._changed[guardian_id] = time.time()
+            self._changed.move_to_end(guardian_id)
+            # Tokens older than ACCESS_TOKEN_EXPIRE_MINUTES are dead anyway, so we can forget about older changes.
+            horizon = time.time() - ACCESS_TOKEN_EXPIRE_MINUTES * 60
+            while self._changed and next(iter(self._changed.values())) < horizon:
+                self._changed.popitem(last=False)
+            self.invalidations += 1
+
+    def clear(self):
+        with self._lock:
+            self._tokens.clear()
+            self._guardians.clear()
+            self._changed.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            token_total = self.token_hits + self.token_misses
+            guardian_total = self.guardian_hits + self.guardian_misses
+            return {
+                "tokens": len(self._tokens),
+                "guardians": len(self._guardians),
+                "token_hits": self.token_hits,
+                "token_misses": self.token_misses,
+                "token_hit_rate": round(self.token_hits / token_total, 4) if token_total else 0.0,
+                "guardian_hits": self.guardian_hits,
+                "guardian_misses": self.guardian_misses,
+                "guardian_hit_rate": round(self.guardian_hits / guardian_total, 4) if guardian_total else 0.0,
+                "claim_hits": self.claim_hits,
+                "invalidations": self.invalidations,
+            }
+
+principal_cache = PrincipalCache()
+
+# --- The Authentication Dependencies ---
+# <-- FIX #2: Define the exception variable here
+credentials_exception = HTTPException(
+    status_code=status.HTTP_401_UNAUTHORIZED,
+    detail="Could not validate credentials",
+    headers={"WWW-Authenticate": "Bearer"},
+)
+
+def decode_token(token: str) -> dict:
+    payload = principal_cache.get_token(token)
+    if payload is not None:
+        return payload
     try:
         payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        guardian_id: str = payload.get("sub")
-        if guardian_id is None:
-            raise credentials_exception
     except JWTError:
         raise credentials_exception
-    
-    guardian = session.exec(select(models.Guardian).where(models.Guardian.id == int(guardian_id))).first()
+    if payload.get("sub") is None:
+        raise credentials_exception
+    principal_cache.put_token(token, payload)
+    return payload
+
+async def load_guardian(session: AsyncSession, guardian_id: int) -> models.Guardian:
+    read_at = time.time()
+    guardian = (await session.exec(select(models.Guardian).where(models.Guardian.id == guardian_id))).first()
     if guardian is None:
         raise credentials_exception
-    return guardian
\ No newline at end of file
+    principal_cache.put_guardian(guardian, read_at)
+    return guardian
+
+async def get_current_guardian(token: str = Depends(oauth2_scheme), session: AsyncSession = Depends(get_session)) -> models.Guardian:
+    """Returns a read-only snapshot of the logged-in guardian, from the cache when we can."""
+    guardian_id = int(decode_token(token)["sub"])
+    guardian = principal_cache.get_guardian(guardian_id)
+    if guardian is None:
+        guardian = await load_guardian(session, guardian_id)
+    return guardian
+
+async def get_current_guardian_for_update(token: str = Depends(oauth2_scheme), session: AsyncSession = Depends(get_session)) -> models.Guardian:
+    """Like get_current_guardian, but always a live row from this session, so it's safe to modify."""
+    return await load_guardian(session, int(decode_token(token)["sub"]))
+
+async def get_current_principal(token: str = Depends(oauth2_scheme), session: AsyncSession = Depends(get_session)) -> Principal:
+    """The cheapest way to know who's calling: cache first, then token claims, then the database."""
+    payload = decode_token(token)
+    guardian_id = int(payload["sub"])
+    guardian = principal_cache.get_guardian(guardian_id)
+    if guardian is not None:
+        return Principal(id=guardian.id, location=guardian.location)
+    if "loc" in payload and principal_cache.claims_are_fresh(guardian_id, payload.get("iat")):
+        return Principal(id=guardian_id, location=payload["loc"])
+    guardian = await load_guardian(session, guardian_id)
+    return Principal(id=guardian.id, location=guardian.location)
\ No newline at end of file
@@ -2,4 +2,71 @@ import os
 
 # Note to self: Load secrets from environment variables for security
 OPENWEATHER_API_KEY = os.getenv("OPENWEATHER_API_KEY")
-# This is a placeholder for the OpenWeather API key.
\ No newline at end of file
+# This is a placeholder for the OpenWeather API key.
+# Reminder to self: Point this at bench/fake_owm.py for load tests so we don't burn real API quota.
+OPENWEATHER_BASE_URL = os.getenv("OPENWEATHER_BASE_URL", "http://api.openweathermap.org").rstrip("/")
+
+# Reminder to self: Weather cache settings. Everyone in the same city shares one cached forecast.
+WEATHER_CACHE_TTL_SECONDS = float(os.getenv("WEATHER_CACHE_TTL_SECONDS", "600"))
+WEATHER_NEGATIVE_TTL_SECONDS = float(os.getenv("WEATHER_NEGATIVE_TTL_SECONDS", "60"))  # How long we remember "no such city"
+WEATHER_CACHE_SIZE = int(os.getenv("WEATHER_CACHE_SIZE", "5000"))  # Max number of cities kept in memory
+WEATHER_TIMEOUT_SECONDS = float(os.getenv("WEATHER_TIMEOUT_SECONDS", "5"))
+WEATHER_POOL_SIZE = int(os.getenv("WEATHER_POOL_SIZE", "20"))  # Pooled HTTP connections to OpenWeatherMap
+
+# Reminder to self: Nudge job settings. Guardians are streamed in chunks and cities are fetched in parallel.
+NUDGE_CHUNK_SIZE = int(os.getenv("NUDGE_CHUNK_SIZE", "1000"))  # Guardians per chunk (and per commit)
+NUDGE_WORKERS = int(os.getenv("NUDGE_WORKERS", "8"))  # Cities fetched at the same time
+NUDGE_INTERVAL_SECONDS = int(os.getenv("NUDGE_INTERVAL_SECONDS", "60"))
+
+# Reminder to self: "local" means every process runs the whole nudge job (fine for one worker).
+# "database" splits each run into guardian id ranges that replicas claim from the nudgeworkunit table.
+NUDGE_COORDINATION = os.getenv("NUDGE_COORDINATION", "local")
+NUDGE_UNIT_SIZE = int(os.getenv("NUDGE_UNIT_SIZE", "5000"))  # Guardian ids per claimable unit
+NUDGE_LEASE_SECONDS = int(os.getenv("NUDGE_LEASE_SECONDS", "45"))  # A claim expires after this if the worker goes quiet
+NUDGE_UNIT_RETENTION_RUNS = int(os.getenv("NUDGE_UNIT_RETENTION_RUNS", "60"))  # How many runs of old units to keep around
+
+# Reminder to self: Habit reminders run off the habitreminder.next_due_at index.
+HABIT_TICK_SECONDS = int(os.getenv("HABIT_TICK_SECONDS", "60"))  # How often we check for due habits
+HABIT_BATCH_SIZE = int(os.getenv("HABIT_BATCH_SIZE", "500"))  # Due reminders handled per transaction
+
+# Reminder to self: Whisper retention. Old whispers are deleted in small batches by a background job.
+WHISPER_RETENTION_DAYS = float(os.getenv("WHISPER_RETENTION_DAYS", "30"))  # 0 keeps whispers forever
+WHISPER_PRUNE_BATCH_SIZE = int(os.getenv("WHISPER_PRUNE_BATCH_SIZE", "5000"))  # Rows deleted per transaction
+WHISPER_PRUNE_INTERVAL_MINUTES = int(os.getenv("WHISPER_PRUNE_INTERVAL_MINUTES", "60"))
+NUDGES_PAGE_SIZE = int(os.getenv("NUDGES_PAGE_SIZE", "50"))  # Default /nudges page size
+NUDGES_MAX_PAGE_SIZE = int(os.getenv("NUDGES_MAX_PAGE_SIZE", "200"))
+
+# Reminder to self: Auth cache. Decoded tokens and guardian snapshots are kept in memory for a short time
+# so hot endpoints don't have to look the guardian up in Postgres on every request.
+AUTH_CACHE_TTL_SECONDS = float(os.getenv("AUTH_CACHE_TTL_SECONDS", "30"))
+AUTH_CACHE_SIZE = int(os.getenv("AUTH_CACHE_SIZE", "10000"))
+# Puts the guardian's location in the token so even a cold cache doesn't need the database.
+# Changes made on another replica can then take up to the token lifetime to show up, so it's off by default.
+AUTH_EMBED_CLAIMS = os.getenv("AUTH_EMBED_CLAIMS", "false").lower() == "true"
+
+# Reminder to self: Password hashing runs on its own small pool so a login rush can't hog the request threads.
+BCRYPT_ROUNDS = int(os.getenv("BCRYPT_ROUNDS", "12"))  # Changing this rehashes passwords on their next login
+# bcrypt releases the GIL, so these really run in parallel. Half the cores, so a login rush leaves the rest for everything else.
+HASH_WORKERS = int(os.getenv("HASH_WORKERS", str(max(1, (os.cpu_count() or 2) // 2))))
+HASH_QUEUE_SIZE = int(os.getenv("HASH_QUEUE_SIZE", "32"))  # Hashes allowed to wait for a worker before we answer 503
+HASH_TIMEOUT_SECONDS = float(os.getenv("HASH_TIMEOUT_SECONDS", "10"))
+
+# Reminder to self: Database settings. The API uses the async engine; background jobs use the sync one.
+SQL_ECHO = os.getenv("SQL_ECHO", "false").lower() == "true"  # Print every SQL statement (noisy, debugging only)
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "10"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "20"))
+DB_POOL_TIMEOUT_SECONDS = float(os.getenv("DB_POOL_TIMEOUT_SECONDS", "30"))
+DB_STATEMENT_TIMEOUT_MS = int(os.getenv("DB_STATEMENT_TIMEOUT_MS", "0"))  # Postgres only, 0 means no limit
+WEATHER_ASYNC_MAX_CONNECTIONS = int(os.getenv("WEATHER_ASYNC_MAX_CONNECTIONS", "200"))  # Pooled connections for the async client
+
+# Reminder to self: Live whisper delivery. "memory" only reaches clients connected to this process,
+# "postgres" uses LISTEN/NOTIFY so a whisper created on any replica reaches clients on every replica.
+EVENTS_BACKEND = os.getenv("EVENTS_BACKEND", "memory")
+EVENTS_CHANNEL = os.getenv("EVENTS_CHANNEL", "luna_whispers")
+SSE_QUEUE_SIZE = int(os.getenv("SSE_QUEUE_SIZE", "100"))  # Whispers buffered per subscriber before we drop the oldest
+SSE_HEARTBEAT_SECONDS = float(os.getenv("SSE_HEARTBEAT_SECONDS", "15"))
+SSE_MAX_SUBSCRIBERS = int(os.getenv("SSE_MAX_SUBSCRIBERS", "10000"))
+LONG_POLL_MAX_SECONDS = float(os.getenv("LONG_POLL_MAX_SECONDS", "30"))
+
+# Reminder to self: Print a query breakdown for any request slower than this (0 turns it off).
+SLOW_REQUEST_MS = float(os.getenv("SLOW_REQUEST_MS", "0"))
@@ -0,0 +1,174 @@
+# File: luna_api/coordination.py
+# Reminder to self: This lets several API replicas share the nudge job instead of each one doing all of it.
+# Every run is split into guardian id ranges (NudgeWorkUnit rows). Workers claim ranges with a lease,
+# so a crashed worker's range gets picked up again once its lease runs out.
+
+import os
+import socket
+import time
+import uuid
+from datetime import datetime, timedelta
+from typing import Optional
+
+from sqlalchemy import delete, func, or_, update
+from sqlalchemy.exc import IntegrityError
+from sqlmodel import Session, select
+
+import config
+import models
+import nudges
+
+# Reminder to self: Unique per process, so two workers in one container don't look like the same worker.
+WORKER_ID = f"{socket.gethostname()}-{os.getpid()}-{uuid.uuid4().hex[:6]}"
+
+
+def current_slot(now: datetime, interval_seconds: int = config.NUDGE_INTERVAL_SECONDS) -> int:
+    """Every replica maps the same scheduler tick to the same slot number."""
+    return int(now.timestamp() // interval_seconds)
+
+
+def bucket_units(slot: int, low: int, high: int, unit_size: int) -> list:
+    """
+    Units covering guardian ids low..high.
+    Reminder to self: Units are fixed id buckets (1..N, N+1..2N, ...), not ranges starting at min(id).
+    Two replicas can see different min/max if a guardian changes between their queries, but a bucket
+    always gets the same start_id, so the unique constraint still turns the second plan away.
+    """
+    first = (low - 1) // unit_size * unit_size + 1
+    return [
+        models.NudgeWorkUnit(run_slot=slot, start_id=start, end_id=start + unit_size - 1)
+        for start in range(first, high + 1, unit_size)
+    ]
+
+
+def plan_units(session: Session, slot: int, unit_size: int = config.NUDGE_UNIT_SIZE) -> int:
+    """
+    Splits the guardian table into id ranges for this slot. The first replica to get here wins;
+    everyone else bumps into the unique constraint and just goes on to claim work.
+    Returns how many units this call created.
+    """
+    already_planned = session.exec(select(models.NudgeWorkUnit.id).where(models.NudgeWorkUnit.run_slot == slot).limit(1)).first()
+    if already_planned is not None:
+        return 0
+
+    low, high = session.exec(
+        select(func.min(models.Guardian.id), func.max(models.Guardian.id))
+        .where(models.Guardian.enable_nudges == True)
+        .where(models.Guardian.location != None)
+    ).one()
+    if low is None:
+        return 0
+
+    units = bucket_units(slot, low, high, unit_size)
+    try:
+        # Old units are only useful for debugging, so tidy them up while we're here.
+        session.execute(delete(models.NudgeWorkUnit).where(models.NudgeWorkUnit.run_slot < slot - config.NUDGE_UNIT_RETENTION_RUNS))
+        session.add_all(units)
+        session.commit()
+    except IntegrityError:
+        session.rollback()
+        return 0
+    return len(units)
+
+
+def claim_unit(session: Session, slot: int, worker_id: str = WORKER_ID,
+               lease_seconds: int = config.NUDGE_LEASE_SECONDS) -> Optional[models.NudgeWorkUnit]:
+    """
+    Claims one open unit from this run (or an abandoned one from the previous run).
+    On Postgres, FOR UPDATE SKIP LOCKED keeps replicas from queueing up behind each other.
+    The conditional UPDATE is what actually makes the claim safe, so this works on SQLite too.
+    """
+    while True:
+        now = datetime.utcnow()
+        claimable = (
+            (models.NudgeWorkUnit.run_slot >= slot - 1)
+            & (models.NudgeWorkUnit.completed_at == None)
+            & or_(models.NudgeWorkUnit.lease_expires_at == None, models.NudgeWorkUnit.lease_expires_at < now)
+        )
+        unit = session.exec(
+            select(models.NudgeWorkUnit)
+            .where(claimable)
+            .order_by(models.NudgeWorkUnit.id)
+            .limit(1)
+            .with_for_update(skip_locked=True)
+        ).first()
+        if unit is None:
+            session.rollback()
+            return None
+
+        claimed = session.execute(
+            update(models.NudgeWorkUnit)
+            .where(models.NudgeWorkUnit.id == unit.id)
+            .where(claimable)
+            .values(
+                leased_by=worker_id,
+                lease_expires_at=now + timedelta(seconds=lease_seconds),
+                attempts=models.NudgeWorkUnit.attempts + 1,
+            )
+        ).rowcount
+        session.commit()
+        if claimed == 1:
+            session.refresh(unit)
+            return unit
+        # Somebody beat us to it between the SELECT and the UPDATE, so try the next one.
+
+
+def renew_lease(session: Session, unit_id: int, worker_id: str = WORKER_ID,
+                lease_seconds: int = config.NUDGE_LEASE_SECONDS) -> bool:
+    """Pushes our lease out a bit. Returns False if we lost the unit to someone else."""
+    renewed = session.execute(
+        update(models.NudgeWorkUnit)
+        .where(models.NudgeWorkUnit.id == unit_id)
+        .where(models.NudgeWorkUnit.leased_by == worker_id)
+        .where(models.NudgeWorkUnit.completed_at == None)
+        .values(lease_expires_at=datetime.utcnow() + timedelta(seconds=lease_seconds))
+    ).rowcount
+    session.commit()
+    return renewed == 1
+
+
+def complete_unit(session: Session, unit_id: int, worker_id: str = WORKER_ID) -> bool:
+    done = session.execute(
+        update(models.NudgeWorkUnit)
+        .where(models.NudgeWorkUnit.id == unit_id)
+        .where(models.NudgeWorkUnit.leased_by == worker_id)
+        .values(completed_at=datetime.utcnow(), lease_expires_at=None)
+    ).rowcount
+    session.commit()
+    return done == 1
+
+
+def run_coordinated_nudge_job(engine, worker_id: str = WORKER_ID, now: Optional[datetime] = None) -> nudges.NudgeRunStats:
+    """Plans this run if nobody has yet, then keeps claiming and processing units until none are left."""
+    total = nudges.NudgeRunStats()
+    started = time.perf_counter()
+    # Shared across units, so a city that shows up in several units is only counted once.
+    seen_cities, failed_cities = set(), set()
+    slot = current_slot(now or datetime.utcnow())
+
+    with Session(engine) as session:
+        plan_units(session, slot)
+
+        while True:
+            unit = claim_unit(session, slot, worker_id)
+            if unit is None:
+                break
+            unit_id = unit.id
+
+            stats = nudges.run_nudge_job(
+                engine, start_id=unit.start_id, end_id=unit.end_id,
+                heartbeat=lambda: renew_lease(session, unit_id, worker_id),
+                seen_cities=seen_cities, failed_cities=failed_cities,
+            )
+            if complete_unit(session, unit_id, worker_id):
+                total.units_processed += 1
+            else:
+                print(f"Lost the lease on nudge unit {unit_id} before finishing it; someone else will pick it up.")
+
+            total.guardians_scanned += stats.guardians_scanned
+            total.whispers_written += stats.whispers_written
+
+    total.cities_fetched = len(seen_cities)
+    total.cities_failed = len(failed_cities - seen_cities)
+    total.wall_time_seconds = round(time.perf_counter() - started, 3)
+    return total
@@ -1,16 +1,57 @@
 # File: luna_api/database.py
 
 import os
-from sqlmodel import create_engine, Session
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import create_async_engine
+from sqlmodel import create_engine
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+import config
+import metrics
 
 # Get the database URL from the environment variable we set in docker-compose.yml
 DATABASE_URL = os.getenv("DATABASE_URL")
 
-# The engine is the central point of communication with the database
-# echo=True will print all the SQL statements to the console, which is great for debugging.
-engine = create_engine(DATABASE_URL, echo=True)
+# Reminder to self: The async engine needs an async driver, so postgresql:// becomes postgresql+asyncpg://
+# (and sqlite:// becomes sqlite+aiosqlite:// for local runs). ASYNC_DATABASE_URL overrides the guess.
+ASYNC_DRIVERS = {"postgresql": "postgresql+asyncpg", "sqlite": "sqlite+aiosqlite"}
+
+def to_async_url(url: str) -> str:
+    parsed = make_url(url)
+    backend = parsed.get_backend_name()
+    return parsed.set(drivername=ASYNC_DRIVERS.get(backend, parsed.drivername)).render_as_string(hide_password=False)
+
+ASYNC_DATABASE_URL = os.getenv("ASYNC_DATABASE_URL") or to_async_url(DATABASE_URL)
+
+def engine_options(url: str) -> dict:
+    """Pool size, overflow, statement timeout and echo, all from config."""
+    options = {"echo": config.SQL_ECHO, "pool_pre_ping": True}
+    parsed = make_url(url)
+    if parsed.get_backend_name() == "sqlite":
+        return options
+
+    options.update(
+        pool_size=config.DB_POOL_SIZE,
+        max_overflow=config.DB_MAX_OVERFLOW,
+        pool_timeout=config.DB_POOL_TIMEOUT_SECONDS,
+    )
+    if config.DB_STATEMENT_TIMEOUT_MS > 0:
+        if parsed.get_driver_name() == "asyncpg":
+            options["connect_args"] = {"server_settings": {"statement_timeout": str(config.DB_STATEMENT_TIMEOUT_MS)}}
+        else:
+            options["connect_args"] = {"options": f"-c statement_timeout={config.DB_STATEMENT_TIMEOUT_MS}"}
+    return options
+
+# The engine is the central point of communication with the database.
+# The sync one is for the background jobs (they run in scheduler threads), the async one is for requests.
+engine = create_engine(DATABASE_URL, **engine_options(DATABASE_URL))
+async_engine = create_async_engine(ASYNC_DATABASE_URL, **engine_options(ASYNC_DATABASE_URL))
+# Reminder to self: Time every SQL statement for /metrics (and the slow request log).
+metrics.instrument_engine(engine, "jobs")
+metrics.instrument_engine(async_engine.sync_engine, "api")
 
-def get_session():
-    """Dependency to get a database session for each request."""
-    with Session(engine) as session:
-        yield session
\ No newline at end of file
+async def get_session():
+    """Dependency to get an async database session for each request."""
+    # expire_on_commit=False so we can still read objects after committing without another round trip.
+    async with AsyncSession(async_engine, expire_on_commit=False) as session:
+        yield session
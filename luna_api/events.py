@@ -0,0 +1,231 @@
+# File: luna_api/events.py
+# Reminder to self: This is the live delivery side of whispers. The jobs publish new whispers here and
+# every connected /nudges/stream client for that guardian gets them pushed, instead of polling /nudges.
+
+import asyncio
+import json
+from datetime import datetime
+from typing import Callable, Dict, List, Optional, Set
+
+from sqlalchemy import text
+
+import config
+from database import engine
+
+# Reminder to self: Postgres refuses NOTIFY payloads over 8000 bytes, so big batches get split up.
+NOTIFY_PAYLOAD_LIMIT = 7500
+
+
+def listener_dsn(url) -> str:
+    """
+    Plain postgresql:// DSN for asyncpg, built from the engine's URL object.
+    Reminder to self: str(url) masks the password as *** in SQLAlchemy 2.0, so never build it from that.
+    """
+    return url.set(drivername="postgresql").render_as_string(hide_password=False)
+
+
+def whisper_event(whisper_id: int, guardian_id: int, message: str, created_at: datetime) -> dict:
+    return {"id": whisper_id, "guardian_id": guardian_id, "message": message, "created_at": created_at.isoformat()}
+
+
+class Subscription:
+    """One connected client. Holds a bounded queue so a slow reader can't make us buffer forever."""
+
+    def __init__(self, guardian_id: int, queue_size: int):
+        self.guardian_id = guardian_id
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=queue_size)
+        self.dropped = 0  # Whispers thrown away because the client wasn't keeping up
+
+    def offer(self, event: dict):
+        if self.queue.full():
+            # Backpressure: drop the oldest so the newest always gets through. The client can catch up
+            # on anything it missed with GET /nudges.
+            self.queue.get_nowait()
+            self.dropped += 1
+        self.queue.put_nowait(event)
+
+
+class BrokerBackend:
+    """
+    How published whispers get to the broker. start() is given a deliver(events) callback that must be
+    called on the event loop; publish() can be called from any thread (the jobs run in scheduler threads).
+    """
+
+    async def start(self, deliver: Callable[[List[dict]], None]):
+        raise NotImplementedError
+
+    def publish(self, events: List[dict]):
+        raise NotImplementedError
+
+    async def stop(self):
+        pass
+
+
+class InMemoryBackend(BrokerBackend):
+    """Only reaches subscribers in this process. Fine for one worker, and for tests."""
+
+    def __init__(self):
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._deliver: Optional[Callable[[List[dict]], None]] = None
+
+    async def start(self, deliver):
+        self._loop = asyncio.get_running_loop()
+        self._deliver = deliver
+
+    def publish(self, events):
+        if self._loop is None or self._loop.is_closed():
+            return  # Nobody can be listening (e.g. a job run outside the API process).
+        self._loop.call_soon_threadsafe(self._deliver, events)
+
+    async def stop(self):
+        self._loop = None
+
+
+class PostgresNotifyBackend(BrokerBackend):
+    """
+    Cross-replica fan-out with LISTEN/NOTIFY. Every replica listens on one channel, and publishing
+    is a NOTIFY in the database, so whichever replica a client is connected to gets the whisper.
+    """
+
+    def __init__(self, engine, channel: str = config.EVENTS_CHANNEL):
+        self.engine = engine
+        self.channel = channel
+        self._connection = None
+        self._deliver = None
+
+    async def start(self, deliver):
+        import asyncpg  # Only needed for this backend
+
+        self._deliver = deliver
+        self._connection = await asyncpg.connect(listener_dsn(self.engine.url))
+        await self._connection.add_listener(self.channel, self._on_notify)
+
+    def _on_notify(self, connection, pid, channel, payload):
+        self._deliver(json.loads(payload))
+
+    def publish(self, events):
+        batches, batch, size = [], [], 0
+        for event in events:
+            encoded = len(json.dumps(event))
+            if batch and size + encoded > NOTIFY_PAYLOAD_LIMIT:
+                batches.append(batch)
+                batch, size = [], 0
+            batch.append(event)
+            size += encoded
+        if batch:
+            batches.append(batch)
+
+        with self.engine.begin() as connection:
+            for batch in batches:
+                connection.execute(text("SELECT pg_notify(:channel, :payload)"), {"channel": self.channel, "payload": json.dumps(batch)})
+
+    async def stop(self):
+        if self._connection is not None:
+            await self._connection.remove_listener(self.channel, self._on_notify)
+            await self._connection.close()
+            self._connection = None
+
+
+class WhisperBroker:
+    """In-process pub/sub: guardian id -> the subscriptions currently streaming for that guardian."""
+
+    def __init__(self, backend: BrokerBackend, queue_size: int = config.SSE_QUEUE_SIZE,
+                 max_subscribers: int = config.SSE_MAX_SUBSCRIBERS):
+        self.backend = backend
+        self.queue_size = queue_size
+        self.max_subscribers = max_subscribers
+        self._subscribers: Dict[int, Set[Subscription]] = {}
+        self.subscriber_count = 0
+        self.published = 0
+        self.delivered = 0
+        self.dropped = 0
+
+    async def start(self):
+        await self.backend.start(self._deliver)
+
+    async def stop(self):
+        await self.backend.stop()
+
+    def subscribe(self, guardian_id: int) -> Optional[Subscription]:
+        """Returns None when we're already at max_subscribers."""
+        if self.subscriber_count >= self.max_subscribers:
+            return None
+        subscription = Subscription(guardian_id, self.queue_size)
+        self._subscribers.setdefault(guardian_id, set()).add(subscription)
+        self.subscriber_count += 1
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription):
+        subscriptions = self._subscribers.get(subscription.guardian_id)
+        if subscriptions and subscription in subscriptions:
+            subscriptions.discard(subscription)
+            self.subscriber_count -= 1
+            self.dropped += subscription.dropped
+            if not subscriptions:
+                del self._subscribers[subscription.guardian_id]
+
+    def publish(self, events: List[dict]):
+        """Safe to call from any thread. Does nothing useful if nobody is subscribed anywhere."""
+        if events:
+            self.published += len(events)
+            self.backend.publish(events)
+
+    def _deliver(self, events: List[dict]):
+        for event in events:
+            for subscription in self._subscribers.get(event["guardian_id"], ()):
+                subscription.offer(event)
+                self.delivered += 1
+
+    def stats(self) -> dict:
+        return {
+            "backend": type(self.backend).__name__,
+            "subscribers": self.subscriber_count,
+            "published": self.published,
+            "delivered": self.delivered,
+            "dropped": self.dropped + sum(s.dropped for subs in self._subscribers.values() for s in subs),
+        }
+
+
+def make_backend(engine) -> BrokerBackend:
+    if config.EVENTS_BACKEND == "postgres":
+        return PostgresNotifyBackend(engine)
+    return InMemoryBackend()
+
+
+async def stream(subscription: Subscription, is_disconnected: Callable, heartbeat_seconds: float = config.SSE_HEARTBEAT_SECONDS):
+    """Turns a subscription into Server-Sent Events, with a comment line every so often to keep proxies happy."""
+    yield "retry: 3000\n\n"
+    reported_drops = 0
+    while not await is_disconnected():
+        try:
+            event = await asyncio.wait_for(subscription.queue.get(), timeout=heartbeat_seconds)
+        except asyncio.TimeoutError:
+            yield ": keep-alive\n\n"
+            continue
+        if subscription.dropped > reported_drops:
+            # Let the client know it missed some, so it can re-sync with GET /nudges?since=...
+            yield f"event: lagged\ndata: {json.dumps({'dropped': subscription.dropped - reported_drops})}\n\n"
+            reported_drops = subscription.dropped
+        yield f"id: {event['id']}\nevent: whisper\ndata: {json.dumps(event)}\n\n"
+
+
+# Reminder to self: One shared broker for the whole process. The API starts it on startup.
+broker = WhisperBroker(make_backend(engine))
+
+
+async def _check_listener():
+    """Opens the Postgres listener, sends one NOTIFY through it and waits for it to come back."""
+    received = asyncio.Event()
+    backend = PostgresNotifyBackend(engine)
+    await backend.start(lambda batch: received.set())
+    try:
+        await asyncio.to_thread(backend.publish, [{"id": 0, "guardian_id": 0, "message": "ping", "created_at": datetime.utcnow().isoformat()}])
+        await asyncio.wait_for(received.wait(), timeout=5)
+    finally:
+        await backend.stop()
+
+
+if __name__ == "__main__":
+    # Smoke check for EVENTS_BACKEND=postgres, e.g. docker compose exec api python events.py
+    asyncio.run(_check_listener())
+    print(f"Listener on channel '{config.EVENTS_CHANNEL}' is working.")
@@ -0,0 +1,126 @@
+# File: luna_api/habits.py
+# Reminder to self: This is the habit reminder engine. Guardian.habits is the source of truth, and the
+# HabitReminder table is an index of "who is due when" built from it, so each tick only touches due rows.
+
+import random
+from datetime import datetime, timedelta
+from typing import Optional
+
+from sqlalchemy import String, cast, insert
+from sqlmodel import Session, select
+
+import config
+import events
+import models
+from nudges import WHISPER_COLUMNS
+
+# Reminder to self: L.U.N.A.'s lines for the habits people set most. Anything else gets the generic one.
+HABIT_LINES = {
+    "water": ["Time to drink some water!", "Hydration check! Go grab a glass of water.", "Your plants aren't the only ones who need water."],
+    "stretch": ["Stand up and stretch, superstar.", "Your back called. It wants a stretch.", "Quick stretch break!"],
+    "walk": ["How about a quick walk?", "Go get some fresh air, you've earned it.", "Time to stretch those legs!"],
+}
+
+
+def habit_message(habit: str) -> str:
+    lines = HABIT_LINES.get(habit.lower())
+    if lines:
+        return random.choice(lines)
+    return random.choice([f"Hey, it's time for your {habit} habit!", f"Don't forget: {habit}!", f"Little reminder about {habit}."])
+
+
+def sync_guardian_habits(session: Session, guardian: models.Guardian, now: Optional[datetime] = None):
+    """
+    Brings a guardian's HabitReminder rows in line with their habits and enable_nudges setting.
+    Call this whenever those change. It doesn't commit, so it lands in the same transaction as the change.
+    """
+    now = now or datetime.utcnow()
+    wanted = {}
+    if guardian.enable_nudges:
+        for name, settings in (guardian.habits or {}).items():
+            if settings.get("enabled") and settings.get("interval_hours", 0) > 0:
+                wanted[name] = float(settings["interval_hours"])
+
+    existing = session.exec(select(models.HabitReminder).where(models.HabitReminder.guardian_id == guardian.id)).all()
+    for reminder in existing:
+        interval = wanted.pop(reminder.habit, None)
+        if interval is None:
+            session.delete(reminder)
+        elif interval != reminder.interval_hours:
+            # New interval, so start counting from now.
+            reminder.interval_hours = interval
+            reminder.next_due_at = now + timedelta(hours=interval)
+            session.add(reminder)
+
+    for name, interval in wanted.items():
+        session.add(models.HabitReminder(
+            guardian_id=guardian.id, habit=name, interval_hours=interval,
+            next_due_at=now + timedelta(hours=interval),
+        ))
+
+
+def rebuild_index(engine, chunk_size: int = config.NUDGE_CHUNK_SIZE) -> int:
+    """
+    Startup backfill for guardians whose habits were saved before the index existed.
+    Only guardians with habits but no reminder rows are looked at; rows that already exist are kept
+    in step by /preferences, which syncs in the same transaction. Returns how many were looked at.
+    """
+    synced, last_id = 0, 0
+    with Session(engine) as session:
+        while True:
+            guardians = session.exec(
+                select(models.Guardian)
+                .where(models.Guardian.habits != None)
+                # Reminder to self: None is stored as the JSON 'null' (not SQL NULL), and {} has nothing to sync.
+                # Only those two exact values get skipped; sync_guardian_habits decides what counts as enabled,
+                # so oddly formatted JSON still gets backfilled (at worst an all-disabled guardian is rescanned).
+                .where(cast(models.Guardian.habits, String).not_in(["null", "{}"]))
+                .where(models.Guardian.enable_nudges == True)
+                .where(models.Guardian.id > last_id)
+                .where(~select(models.HabitReminder.id).where(models.HabitReminder.guardian_id == models.Guardian.id).exists())
+                .order_by(models.Guardian.id)
+                .limit(chunk_size)
+            ).all()
+            if not guardians:
+                return synced
+            for guardian in guardians:
+                sync_guardian_habits(session, guardian)
+            session.commit()
+            synced += len(guardians)
+            last_id = guardians[-1].id
+
+
+def run_due_habits(engine, now: Optional[datetime] = None, batch_size: int = config.HABIT_BATCH_SIZE) -> int:
+    """
+    Sends a whisper for every habit that's due and pushes its next_due_at forward.
+    Cost is O(due reminders), not O(guardians). Rows are locked with SKIP LOCKED on Postgres,
+    so several replicas can run this at once without double-reminding anybody.
+    Returns how many reminders were sent.
+    """
+    now = now or datetime.utcnow()
+    sent = 0
+    with Session(engine) as session:
+        while True:
+            due = session.exec(
+                select(models.HabitReminder)
+                .where(models.HabitReminder.next_due_at <= now)
+                .order_by(models.HabitReminder.next_due_at)
+                .limit(batch_size)
+                .with_for_update(skip_locked=True)
+            ).all()
+            if not due:
+                return sent
+
+            rows = []
+            for reminder in due:
+                rows.append({"guardian_id": reminder.guardian_id, "message": habit_message(reminder.habit), "created_at": now})
+                next_due = reminder.next_due_at + timedelta(hours=reminder.interval_hours)
+                if next_due <= now:
+                    # We were down for a while; don't fire a backlog of reminders, just start again from now.
+                    next_due = now + timedelta(hours=reminder.interval_hours)
+                reminder.next_due_at = next_due
+                session.add(reminder)
+            created = session.execute(insert(models.Whisper).returning(*WHISPER_COLUMNS), rows).all()
+            session.commit()
+            events.broker.publish([events.whisper_event(*row) for row in created])
+            sent += len(rows)
@@ -1,70 +1,107 @@
 # File: luna_api/main.py
 
 # Reminder to self: This is the imports section.
+import asyncio
 import os
-from fastapi import FastAPI, Depends, HTTPException
+from datetime import datetime
+from fastapi import FastAPI, Depends, HTTPException, Query, Request
+from fastapi.responses import PlainTextResponse, StreamingResponse
 from fastapi.security import OAuth2PasswordRequestForm
-from sqlmodel import Session, select
-from typing import Optional, List
+from sqlmodel import select
+from sqlmodel.ext.asyncio.session import AsyncSession
+from typing import Optional
 from apscheduler.schedulers.background import BackgroundScheduler
 
 # Reminder to self: I'm importing all of our own project modules here.
 import auth
+import config
+import coordination
+import events
+import habits
+import metrics
 import models
+import nudges
 import services
-from database import engine, get_session
+from database import async_engine, engine, get_session
 import schemas
+import weather
+import whispers
 
 # Reminder to self: This is the function the scheduler will run in the background.
+@metrics.timed_job("generate_all_nudges", config.NUDGE_INTERVAL_SECONDS)
 def generate_all_nudges():
     """This job finds all eligible users and creates a recommendation whisper for them."""
-    print("Scheduler is running the daily nudge job...")
-    with Session(engine) as session:
-        guardians_to_nudge = session.exec(
-            select(models.Guardian).where(models.Guardian.enable_nudges == True).where(models.Guardian.location != None)
-        ).all()
+    print("Scheduler is running the nudge job...")
+    if config.NUDGE_COORDINATION == "database":
+        # Several replicas: only do the slices of the table we manage to claim.
+        stats = coordination.run_coordinated_nudge_job(engine)
+    else:
+        stats = nudges.run_nudge_job(engine)
+    print(f"Nudge job complete. {stats.as_dict()}")
+    for item in ("guardians_scanned", "cities_fetched", "cities_failed", "whispers_written", "units_processed"):
+        metrics.NUDGE_ROWS.inc(getattr(stats, item), item=item)
 
-        for guardian in guardians_to_nudge:
-            try:
-                # Assuming a default gender for automatic nudges for now
-                recommendation = services.generate_weather_recommendation(city=guardian.location, gender="unisex")
-                # The field in the Whisper model is 'message', not 'content'
-                whisper = models.Whisper(message=recommendation, guardian_id=guardian.id)
-                session.add(whisper)
-            except Exception as e:
-                print(f"Failed to generate nudge for guardian {guardian.id}: {e}")
-        
-        session.commit()
-        print(f"Nudge job complete. Generated nudges for {len(guardians_to_nudge)} guardians.")
+# Reminder to self: This one only looks at habit reminders that are due, not the whole guardian table.
+@metrics.timed_job("send_due_habit_reminders", config.HABIT_TICK_SECONDS)
+def send_due_habit_reminders():
+    """This job sends a whisper for every habit that's due right now."""
+    sent = habits.run_due_habits(engine)
+    if sent:
+        print(f"Habit reminder job complete. Sent {sent} reminders.")
+
+# Reminder to self: Keeps the whisper table from growing forever.
+@metrics.timed_job("prune_whispers", config.WHISPER_PRUNE_INTERVAL_MINUTES * 60)
+def prune_whispers():
+    """This job deletes whispers older than the retention window, a batch at a time."""
+    deleted = whispers.prune_old_whispers(engine)
+    if deleted:
+        print(f"Whisper pruning complete. Deleted {deleted} old whispers.")
 
 # Reminder to self: Create the scheduler instance.
 scheduler = BackgroundScheduler()
+metrics.instrument_scheduler(scheduler)
 
 # Reminder to self: This is the FastAPI app setup section.
 app = FastAPI(title="L.U.N.A.")
+app.add_middleware(metrics.MetricsMiddleware)
+
+# Reminder to self: The caches keep their own counters, so /metrics just reads them when it's scraped.
+metrics.registry.add_collector(lambda: metrics.gauges("luna_weather_cache", "Weather cache counter", weather.provider.stats()))
+metrics.registry.add_collector(lambda: metrics.gauges("luna_auth_cache", "Auth cache counter", auth.principal_cache.stats()))
+metrics.registry.add_collector(lambda: metrics.gauges("luna_events", "Whisper broker counter", events.broker.stats()))
 
 # Reminder to self: This is the startup/shutdown event section.
 @app.on_event("startup")
-def on_startup():
-    """This creates database tables and starts the background scheduler."""
+async def on_startup():
+    """This creates database tables, starts the whisper broker and starts the background scheduler."""
     models.SQLModel.metadata.create_all(engine)
-    scheduler.add_job(generate_all_nudges, 'interval', minutes=1)
+    # create_all skips tables that already exist, so add any indexes that older databases are missing.
+    for index in models.Whisper.__table__.indexes:
+        index.create(engine, checkfirst=True)
+    habits.rebuild_index(engine)
+    scheduler.add_job(generate_all_nudges, 'interval', seconds=config.NUDGE_INTERVAL_SECONDS)
+    scheduler.add_job(send_due_habit_reminders, 'interval', seconds=config.HABIT_TICK_SECONDS)
+    scheduler.add_job(prune_whispers, 'interval', minutes=config.WHISPER_PRUNE_INTERVAL_MINUTES)
     scheduler.start()
+    await events.broker.start()
 
 @app.on_event("shutdown")
-def on_shutdown():
-    """This cleanly shuts down the scheduler when the app stops."""
+async def on_shutdown():
+    """This cleanly shuts down the scheduler and closes our connection pools when the app stops."""
     scheduler.shutdown()
+    await events.broker.stop()
+    await weather.provider.aclose()
+    await async_engine.dispose()
 
 # Reminder to self: This is the API endpoints section.
 @app.post("/signup", response_model=models.Guardian)
-def create_guardian(guardian_data: schemas.GuardianCreate, session: Session = Depends(get_session)):
+async def create_guardian(guardian_data: schemas.GuardianCreate, session: AsyncSession = Depends(get_session)):
     """This endpoint creates a new user (Guardian)."""
-    existing = session.exec(select(models.Guardian).where(models.Guardian.email == guardian_data.email)).first()
+    existing = (await session.exec(select(models.Guardian).where(models.Guardian.email == guardian_data.email))).first()
     if existing:
         raise HTTPException(status_code=400, detail="Email already registered")
 
-    hashed_password = auth.get_password_hash(guardian_data.password)
+    hashed_password = await auth.get_password_hash(guardian_data.password)
     db_guardian = models.Guardian(
         email=guardian_data.email, 
         hashed_password=hashed_password,
@@ -72,27 +109,35 @@ def create_guardian(guardian_data: schemas.GuardianCreate, session: Session = De
         enable_nudges=True
     )
     session.add(db_guardian)
-    session.commit()
-    session.refresh(db_guardian)
+    await session.commit()
+    await session.refresh(db_guardian)
     return db_guardian
 
 @app.post("/login")
-def login(form_data: OAuth2PasswordRequestForm = Depends(), session: Session = Depends(get_session)):
-    guardian = session.exec(select(models.Guardian).where(models.Guardian.email == form_data.username)).first()
-    if not guardian or not auth.verify_password(form_data.password, guardian.hashed_password):
+async def login(form_data: OAuth2PasswordRequestForm = Depends(), session: AsyncSession = Depends(get_session)):
+    guardian = (await session.exec(select(models.Guardian).where(models.Guardian.email == form_data.username))).first()
+    if not guardian:
+        raise HTTPException(status_code=401, detail="Invalid email or password")
+    valid, new_hash = await auth.verify_and_rehash(form_data.password, guardian.hashed_password)
+    if not valid:
         raise HTTPException(status_code=401, detail="Invalid email or password")
+    if new_hash:
+        # The bcrypt cost changed since this password was saved, so upgrade it while we have the plain text.
+        guardian.hashed_password = new_hash
+        session.add(guardian)
+        await session.commit()
     
     # This line is critical: it must use str(guardian.id)
-    token = auth.create_access_token(data={"sub": str(guardian.id)})
+    token = auth.create_access_token(data={"sub": str(guardian.id)}, guardian=guardian)
     return {"access_token": token, "token_type": "bearer"}
 
 @app.get("/users/me", response_model=models.Guardian)
-def read_users_me(current_guardian: models.Guardian = Depends(auth.get_current_guardian)):
+async def read_users_me(current_guardian: models.Guardian = Depends(auth.get_current_guardian)):
     """This is a test endpoint to check if authentication is working."""
     return current_guardian
 
 @app.get("/recommendation")
-def get_recommendation(gender: str, current_guardian: models.Guardian = Depends(auth.get_current_guardian)):
+async def get_recommendation(gender: str, current_guardian: auth.Principal = Depends(auth.get_current_principal)):
     """This is our core feature. It generates an outfit recommendation for the logged-in user."""
     if not current_guardian.location:
         raise HTTPException(
@@ -100,14 +145,14 @@ def get_recommendation(gender: str, current_guardian: models.Guardian = Depends(
             detail="No location found. Please set one via the /preferences endpoint."
         )
     
-    recommendation = services.generate_weather_recommendation(city=current_guardian.location, gender=gender)
+    recommendation = await services.generate_weather_recommendation(city=current_guardian.location, gender=gender)
     return {"recommendation": recommendation}
 
 @app.patch("/preferences", response_model=models.Guardian)
-def update_preferences(
+async def update_preferences(
     preferences: schemas.PreferencesUpdate,
-    current_guardian: models.Guardian = Depends(auth.get_current_guardian),
-    session: Session = Depends(get_session)
+    current_guardian: models.Guardian = Depends(auth.get_current_guardian_for_update),
+    session: AsyncSession = Depends(get_session)
 ):
     """This endpoint lets a logged-in user update their preferences."""
     # Handle simple, non-nested updates
@@ -118,18 +163,103 @@ def update_preferences(
         
     # CRITICAL FIX: Specifically handle the complex 'habits' dictionary
     if preferences.habits is not None:
-        current_habits = current_guardian.habits or {}
+        # Copy it, otherwise SQLAlchemy sees the same dict object come back and never saves the change.
+        current_habits = dict(current_guardian.habits or {})
         new_habits = {key: value.model_dump() for key, value in preferences.habits.items()}
         current_habits.update(new_habits)
         current_guardian.habits = current_habits
 
+    # Keep the habit reminder index in step with what the user just changed.
+    if preferences.habits is not None or preferences.enable_nudges is not None:
+        await session.run_sync(habits.sync_guardian_habits, current_guardian)
+
     session.add(current_guardian)
-    session.commit()
-    session.refresh(current_guardian)
+    await session.commit()
+    await session.refresh(current_guardian)
+    auth.principal_cache.invalidate_guardian(current_guardian.id)
     return current_guardian
 
-@app.get("/nudges", response_model=List[models.Whisper])
-def get_nudges(current_guardian: models.Guardian = Depends(auth.get_current_guardian), session: Session = Depends(get_session)):
-    """This endpoint lets a user see all the nudges the scheduler has created for them."""
-    nudges = session.exec(select(models.Whisper).where(models.Whisper.guardian_id == current_guardian.id)).all()
-    return nudges
\ No newline at end of file
+@app.get("/nudges", response_model=schemas.NudgePage)
+async def get_nudges(
+    limit: int = Query(config.NUDGES_PAGE_SIZE, ge=1, le=config.NUDGES_MAX_PAGE_SIZE),
+    cursor: Optional[str] = None,
+    since: Optional[datetime] = None,
+    include_unread: bool = False,
+    current_guardian: auth.Principal = Depends(auth.get_current_principal),
+    session: AsyncSession = Depends(get_session)
+):
+    """This endpoint lets a user page through their nudges, newest first."""
+    items, next_cursor = await whispers.get_page(session, current_guardian.id, limit, cursor=cursor, since=since)
+    unread = await whispers.unread_count(session, current_guardian.id) if include_unread else None
+    return schemas.NudgePage(items=items, next_cursor=next_cursor, unread_count=unread)
+
+@app.post("/nudges/read")
+async def mark_nudges_read(
+    body: schemas.NudgesRead,
+    current_guardian: auth.Principal = Depends(auth.get_current_principal),
+    session: AsyncSession = Depends(get_session)
+):
+    """This endpoint marks nudges as read, so they stop counting towards unread_count."""
+    last_read_at = await whispers.mark_read(session, current_guardian.id, body.up_to)
+    await session.commit()
+    return {"last_read_at": last_read_at}
+
+@app.get("/nudges/stream")
+async def stream_nudges(request: Request, current_guardian: auth.Principal = Depends(auth.get_current_principal)):
+    """This endpoint pushes new nudges to the client as they're created (Server-Sent Events)."""
+    subscription = events.broker.subscribe(current_guardian.id)
+    if subscription is None:
+        raise HTTPException(status_code=503, detail="Too many people listening right now. Try again soon?", headers={"Retry-After": "5"})
+
+    async def event_stream():
+        try:
+            async for chunk in events.stream(subscription, request.is_disconnected):
+                yield chunk
+        finally:
+            events.broker.unsubscribe(subscription)
+
+    return StreamingResponse(event_stream(), media_type="text/event-stream", headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+@app.get("/nudges/poll", response_model=schemas.NudgePage)
+async def poll_nudges(
+    since: datetime,
+    timeout: float = Query(config.LONG_POLL_MAX_SECONDS, gt=0, le=config.LONG_POLL_MAX_SECONDS),
+    current_guardian: auth.Principal = Depends(auth.get_current_principal),
+    session: AsyncSession = Depends(get_session)
+):
+    """
+    Long-poll fallback for clients that can't do SSE: returns as soon as there's something newer than since.
+    If next_cursor is set there were more than one page of them, so fetch the rest with
+    GET /nudges?since=...&cursor=... before moving since forward.
+    """
+    # Subscribe before checking the database, so nothing created in between slips through the gap.
+    subscription = events.broker.subscribe(current_guardian.id)
+    if subscription is None:
+        raise HTTPException(status_code=503, detail="Too many people listening right now. Try again soon?", headers={"Retry-After": "5"})
+    try:
+        items, next_cursor = await whispers.get_page(session, current_guardian.id, config.NUDGES_MAX_PAGE_SIZE, since=since)
+        # Give the connection back to the pool before we sit around waiting.
+        await session.close()
+        if not items:
+            try:
+                event = await asyncio.wait_for(subscription.queue.get(), timeout=timeout)
+            except asyncio.TimeoutError:
+                return schemas.NudgePage(items=[])
+            pending = [event]
+            while not subscription.queue.empty():
+                pending.append(subscription.queue.get_nowait())
+            items = [models.Whisper(**{**e, "created_at": datetime.fromisoformat(e["created_at"])}) for e in reversed(pending)]
+        return schemas.NudgePage(items=items, next_cursor=next_cursor)
+    finally:
+        events.broker.unsubscribe(subscription)
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def get_metrics():
+    """This endpoint exposes everything we measure in the Prometheus text format."""
+    return PlainTextResponse(metrics.registry.render(), media_type="text/plain; version=0.0.4")
+
+@app.get("/stats")
+async def get_stats():
+    """This endpoint shows cache counters so we can see how much upstream traffic we're saving."""
+    return {"weather_cache": weather.provider.stats(), "auth_cache": auth.principal_cache.stats(),
+            "password_hashing": auth.hashing_pool.stats(), "events": events.broker.stats()}
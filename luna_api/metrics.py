@@ -0,0 +1,287 @@
+# File: luna_api/metrics.py
+# Reminder to self: This is where all the performance numbers live. GET /metrics renders them in the
+# Prometheus text format. Small hand-rolled counters/histograms so we don't need another dependency.
+
+import contextvars
+import functools
+import threading
+import time
+from bisect import bisect_left
+from typing import Callable, Dict, List, Optional, Tuple
+
+from sqlalchemy import event
+
+import config
+
+# Reminder to self: Seconds. Covers everything from a cache hit to a really slow OpenWeatherMap call.
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+COUNT_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100)
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(labelnames: Tuple[str, ...], values: Tuple[str, ...], extra: str = "") -> str:
+    parts = [f'{name}="{_escape(value)}"' for name, value in zip(labelnames, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+class Counter:
+    def __init__(self, name: str, documentation: str, labelnames: Tuple[str, ...] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = labelnames
+        self._values: Dict[Tuple[str, ...], float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1, **labels):
+        key = tuple(str(labels[name]) for name in self.labelnames)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            for key, value in sorted(self._values.items()):
+                lines.append(f"{self.name}{_format_labels(self.labelnames, key)} {value}")
+        return lines
+
+
+class Histogram:
+    def __init__(self, name: str, documentation: str, labelnames: Tuple[str, ...] = (), buckets: Tuple[float, ...] = LATENCY_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = labelnames
+        self.buckets = tuple(sorted(buckets))
+        self._values: Dict[Tuple[str, ...], list] = {}  # labels -> [per-bucket counts..., +Inf count, sum]
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, **labels):
+        key = tuple(str(labels[name]) for name in self.labelnames)
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._values.get(key)
+            if series is None:
+                series = self._values[key] = [0] * (len(self.buckets) + 1) + [0.0]
+            series[index] += 1
+            series[-1] += value
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            for key, series in sorted(self._values.items()):
+                cumulative = 0
+                for bound, count in zip(self.buckets, series):
+                    cumulative += count
+                    labels = _format_labels(self.labelnames, key, 'le="%s"' % bound)
+                    lines.append(f"{self.name}_bucket{labels} {cumulative}")
+                cumulative += series[len(self.buckets)]
+                labels = _format_labels(self.labelnames, key, 'le="+Inf"')
+                lines.append(f"{self.name}_bucket{labels} {cumulative}")
+                lines.append(f"{self.name}_sum{_format_labels(self.labelnames, key)} {series[-1]}")
+                lines.append(f"{self.name}_count{_format_labels(self.labelnames, key)} {cumulative}")
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self._metrics: list = []
+        self._collectors: List[Callable[[], List[str]]] = []
+
+    def register(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def add_collector(self, collector: Callable[[], List[str]]):
+        """For numbers that live somewhere else (cache counters etc.) and are read at scrape time."""
+        self._collectors.append(collector)
+
+    def render(self) -> str:
+        lines = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        for collector in self._collectors:
+            lines.extend(collector())
+        return "\n".join(lines) + "\n"
+
+
+def gauges(prefix: str, documentation: str, values: dict) -> List[str]:
+    """Renders a flat dict of numbers (like weather.provider.stats()) as gauges."""
+    lines = []
+    for key, value in values.items():
+        if isinstance(value, bool) or not isinstance(value, (int, float)):
+            continue
+        name = f"{prefix}_{key}"
+        lines += [f"# HELP {name} {documentation} ({key})", f"# TYPE {name} gauge", f"{name} {value}"]
+    return lines
+
+
+registry = Registry()
+
+# --- HTTP ---
+HTTP_REQUEST_SECONDS = registry.register(Histogram(
+    "luna_http_request_duration_seconds", "Time until the response headers are sent, per route", ("method", "route", "status")))
+HTTP_DB_QUERIES = registry.register(Histogram(
+    "luna_http_request_db_queries", "SQL statements run per request", ("route",), buckets=COUNT_BUCKETS))
+HTTP_DB_SECONDS = registry.register(Histogram(
+    "luna_http_request_db_seconds", "Time spent in SQL per request", ("route",)))
+
+# --- Database ---
+DB_QUERY_SECONDS = registry.register(Histogram(
+    "luna_db_query_duration_seconds", "SQL statement execution time", ("engine",)))
+
+# --- OpenWeatherMap ---
+WEATHER_CALL_SECONDS = registry.register(Histogram(
+    "luna_weather_call_duration_seconds", "OpenWeatherMap call latency", ("client", "outcome")))
+WEATHER_CALL_ERRORS = registry.register(Counter(
+    "luna_weather_call_errors_total", "OpenWeatherMap calls that failed", ("client", "reason")))
+
+# --- Password hashing ---
+PASSWORD_HASH_SECONDS = registry.register(Histogram(
+    "luna_password_hash_duration_seconds", "bcrypt time per operation", ("operation",)))
+PASSWORD_HASH_QUEUE_SECONDS = registry.register(Histogram(
+    "luna_password_hash_queue_seconds", "Time waiting for a hashing worker", ("operation",)))
+PASSWORD_HASH_REJECTED = registry.register(Counter(
+    "luna_password_hash_rejected_total", "Hashing requests turned away because the pool was full"))
+
+# --- Scheduler ---
+JOB_SECONDS = registry.register(Histogram(
+    "luna_job_duration_seconds", "Background job run time", ("job", "outcome")))
+JOB_LAG_SECONDS = registry.register(Histogram(
+    "luna_job_lag_seconds", "How late a job started compared to when it was scheduled", ("job",)))
+JOB_OVERRUNS = registry.register(Counter(
+    "luna_job_overruns_total", "Runs that took longer than the job interval, or were skipped/missed because of it", ("job", "kind")))
+NUDGE_ROWS = registry.register(Counter(
+    "luna_nudge_job_items_total", "What the nudge job processed", ("item",)))
+
+
+# --- Per-request query tracking ---
+class RequestStats:
+    """Collected for the current request while it runs (through a contextvar)."""
+
+    def __init__(self):
+        self.queries: List[Tuple[str, float]] = []
+
+    @property
+    def db_seconds(self) -> float:
+        return sum(duration for _, duration in self.queries)
+
+
+current_request: contextvars.ContextVar[Optional[RequestStats]] = contextvars.ContextVar("luna_request_stats", default=None)
+
+
+def instrument_engine(engine, name: str):
+    """Hooks SQLAlchemy's cursor events so every statement is timed (and tied to its request, if any)."""
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def _before(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("luna_query_start", []).append(time.perf_counter())
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def _after(conn, cursor, statement, parameters, context, executemany):
+        starts = conn.info.get("luna_query_start")
+        if not starts:
+            return
+        duration = time.perf_counter() - starts.pop()
+        DB_QUERY_SECONDS.observe(duration, engine=name)
+        stats = current_request.get()
+        if stats is not None:
+            stats.queries.append((statement, duration))
+
+
+class MetricsMiddleware:
+    """
+    Plain ASGI middleware (so it doesn't buffer SSE streams). Times each request up to the response
+    headers, counts its SQL and, when SLOW_REQUEST_MS is set, prints a query breakdown for slow ones.
+    """
+
+    def __init__(self, app, slow_request_ms: float = config.SLOW_REQUEST_MS):
+        self.app = app
+        self.slow_request_ms = slow_request_ms
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        stats = RequestStats()
+        token = current_request.set(stats)
+        started = time.perf_counter()
+        status = {"code": 500, "recorded": False}
+
+        def record():
+            if status["recorded"]:
+                return
+            status["recorded"] = True
+            duration = time.perf_counter() - started
+            route = getattr(scope.get("route"), "path", "unmatched")
+            HTTP_REQUEST_SECONDS.observe(duration, method=scope["method"], route=route, status=status["code"])
+            HTTP_DB_QUERIES.observe(len(stats.queries), route=route)
+            HTTP_DB_SECONDS.observe(stats.db_seconds, route=route)
+            if self.slow_request_ms and duration * 1000 >= self.slow_request_ms:
+                log_slow_request(scope["method"], scope["path"], status["code"], duration, stats)
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                status["code"] = message["status"]
+                record()
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            record()
+            current_request.reset(token)
+
+
+def log_slow_request(method: str, path: str, status_code: int, duration: float, stats: RequestStats, top: int = 5):
+    print(f"SLOW REQUEST {method} {path} -> {status_code} in {duration * 1000:.1f}ms "
+          f"({len(stats.queries)} queries, {stats.db_seconds * 1000:.1f}ms in SQL)")
+    for statement, seconds in sorted(stats.queries, key=lambda q: q[1], reverse=True)[:top]:
+        print(f"    {seconds * 1000:8.1f}ms  {' '.join(statement.split())[:200]}")
+
+
+# --- Scheduler instrumentation ---
+def timed_job(name: str, interval_seconds: float):
+    """Wraps a scheduler job so we know how long it took and whether it ran past its own interval."""
+
+    def decorator(fn):
+        # wraps() copies __qualname__ too, which is what APScheduler names the job after (and we label metrics by).
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            started = time.perf_counter()
+            outcome = "success"
+            try:
+                return fn(*args, **kwargs)
+            except Exception:
+                outcome = "error"
+                raise
+            finally:
+                duration = time.perf_counter() - started
+                JOB_SECONDS.observe(duration, job=name, outcome=outcome)
+                if duration > interval_seconds:
+                    JOB_OVERRUNS.inc(job=name, kind="ran_past_interval")
+
+        return wrapper
+
+    return decorator
+
+
+def instrument_scheduler(scheduler):
+    """Start lag from submission events, and skipped/missed runs (the job was still busy, or we were asleep)."""
+    from apscheduler.events import EVENT_JOB_MAX_INSTANCES, EVENT_JOB_MISSED, EVENT_JOB_SUBMITTED
+
+    def listener(job_event):
+        job = scheduler.get_job(job_event.job_id)
+        name = job.name if job is not None else job_event.job_id
+        if job_event.code == EVENT_JOB_SUBMITTED:
+            for scheduled in job_event.scheduled_run_times:
+                JOB_LAG_SECONDS.observe(max(0.0, time.time() - scheduled.timestamp()), job=name)
+        elif job_event.code == EVENT_JOB_MAX_INSTANCES:
+            JOB_OVERRUNS.inc(job=name, kind="skipped_still_running")
+        elif job_event.code == EVENT_JOB_MISSED:
+            JOB_OVERRUNS.inc(job=name, kind="missed")
+
+    scheduler.add_listener(listener, EVENT_JOB_SUBMITTED | EVENT_JOB_MAX_INSTANCES | EVENT_JOB_MISSED)
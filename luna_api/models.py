@@ -2,7 +2,7 @@
 from sqlmodel import SQLModel, Field
 from typing import Optional
 from datetime import datetime
-from sqlalchemy import JSON, Column  # Reminder: Import JSON from sqlalchemy for JSONB fields in PostgreSQL
+from sqlalchemy import JSON, Column, Index, UniqueConstraint  # Reminder: Import JSON from sqlalchemy for JSONB fields in PostgreSQL
 
 class Guardian(SQLModel, table=True):
     id: Optional[int] = Field(default=None, primary_key=True)  # Auto-generated ID
@@ -23,7 +23,42 @@ class Garment(SQLModel, table=True):
     created_at: datetime = Field(default_factory=datetime.utcnow)  # Timestamp when created
 
 class Whisper(SQLModel, table=True):
+    # Reminder to self: /nudges pages through one guardian's whispers newest-first, so this index covers it exactly.
+    __table_args__ = (Index("ix_whisper_guardian_created", "guardian_id", "created_at", "id"),)
+
     id: Optional[int] = Field(default=None, primary_key=True)  # Auto-generated ID
     guardian_id: int = Field(foreign_key="guardian.id")  # Links to Guardian
     message: str  # Nudge message, e.g., "Time to drink water!"
-    created_at: datetime = Field(default_factory=datetime.utcnow)  # Timestamp when created
\ No newline at end of file
+    created_at: datetime = Field(default_factory=datetime.utcnow, index=True)  # Timestamp when created (indexed for retention pruning)
+
+class NudgeWorkUnit(SQLModel, table=True):
+    # Reminder to self: One claimable slice (a guardian id range) of one nudge run, so replicas can share the work.
+    __table_args__ = (UniqueConstraint("run_slot", "start_id"),)  # Two replicas can't plan the same slice twice
+
+    id: Optional[int] = Field(default=None, primary_key=True)  # Auto-generated ID
+    run_slot: int = Field(index=True)  # Which scheduler run this belongs to (unix time // interval)
+    start_id: int  # First guardian id in the slice
+    end_id: int  # Last guardian id in the slice (inclusive)
+    leased_by: Optional[str] = Field(default=None)  # Worker currently holding the claim
+    lease_expires_at: Optional[datetime] = Field(default=None)  # Claim is up for grabs again after this
+    attempts: int = Field(default=0)  # How many times it has been claimed
+    completed_at: Optional[datetime] = Field(default=None)  # Set once the slice is done
+    created_at: datetime = Field(default_factory=datetime.utcnow)  # Timestamp when created
+
+
+class HabitReminder(SQLModel, table=True):
+    # Reminder to self: One row per enabled habit, indexed by when it's next due, so the reminder job
+    # only ever looks at guardians who actually need a nudge right now.
+    __table_args__ = (UniqueConstraint("guardian_id", "habit"),)
+
+    id: Optional[int] = Field(default=None, primary_key=True)  # Auto-generated ID
+    guardian_id: int = Field(foreign_key="guardian.id", index=True)  # Links to Guardian
+    habit: str  # Habit name, e.g., "water"
+    interval_hours: float  # How often to remind, copied from Guardian.habits
+    next_due_at: datetime = Field(index=True)  # When the next reminder should go out
+
+
+class NudgeReadMarker(SQLModel, table=True):
+    # Reminder to self: Everything after last_read_at counts as unread, so the unread count is one index range count.
+    guardian_id: int = Field(foreign_key="guardian.id", primary_key=True)  # Links to Guardian
+    last_read_at: datetime  # Newest whisper the guardian has seen
@@ -0,0 +1,146 @@
+# File: luna_api/nudges.py
+# Reminder to self: This is the nudge job pipeline. It streams guardians in chunks, fetches each city
+# only once (in parallel), and bulk-writes the whispers, committing after every chunk.
+
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
+from dataclasses import asdict, dataclass
+from datetime import datetime
+from typing import Callable, Optional
+
+from sqlalchemy import insert
+from sqlmodel import Session, select
+
+import config
+import events
+import models
+import services
+from weather import normalize_city, provider
+
+# Reminder to self: What we get back from the bulk insert, in events.whisper_event() argument order.
+WHISPER_COLUMNS = (models.Whisper.id, models.Whisper.guardian_id, models.Whisper.message, models.Whisper.created_at)
+
+
+@dataclass
+class NudgeRunStats:
+    """What one run of the nudge job did."""
+    guardians_scanned: int = 0
+    cities_fetched: int = 0
+    cities_failed: int = 0
+    whispers_written: int = 0
+    units_processed: int = 0
+    wall_time_seconds: float = 0.0
+
+    def as_dict(self) -> dict:
+        return asdict(self)
+
+
+def iter_guardian_chunks(session: Session, chunk_size: int, start_id: int = 1, end_id: Optional[int] = None):
+    """
+    Yields (id, location) rows for guardians that want nudges, chunk_size at a time.
+    Uses keyset pagination on id so every chunk is a cheap index range scan.
+    start_id/end_id (inclusive) limit it to one slice of the table.
+    """
+    last_id = start_id - 1
+    while True:
+        query = (
+            select(models.Guardian.id, models.Guardian.location)
+            .where(models.Guardian.enable_nudges == True)
+            .where(models.Guardian.location != None)
+            .where(models.Guardian.id > last_id)
+        )
+        if end_id is not None:
+            query = query.where(models.Guardian.id <= end_id)
+        rows = session.exec(query.order_by(models.Guardian.id).limit(chunk_size)).all()
+        if not rows:
+            return
+        yield rows
+        last_id = rows[-1][0]
+
+
+def fetch_cities(pool: ThreadPoolExecutor, cities: dict) -> tuple:
+    """
+    Fetches weather for {city_key: display_name} in parallel.
+    Returns ({city_key: weather}, {city_key: reason}) so one bad city never sinks the rest.
+    """
+    futures = {pool.submit(provider.get, name): key for key, name in cities.items()}
+    # Reminder to self: No deadline for the whole batch here. Every call is capped by the provider's own
+    # request timeout (WEATHER_TIMEOUT_SECONDS), counted from when it actually starts. A batch-wide limit
+    # used to "time out" cities that were still queued for a worker and had never been fetched.
+    done, _ = wait(futures)
+
+    weather_by_city, failed = {}, {}
+    for future in done:
+        key = futures[future]
+        try:
+            weather = future.result()
+        except Exception as e:
+            failed[key] = str(e)
+            continue
+        if weather is None:
+            failed[key] = "unknown city"
+        else:
+            weather_by_city[key] = weather
+    return weather_by_city, failed
+
+
+def run_nudge_job(engine, start_id: int = 1, end_id: Optional[int] = None,
+                  heartbeat: Optional[Callable[[], bool]] = None,
+                  chunk_size: int = config.NUDGE_CHUNK_SIZE, workers: int = config.NUDGE_WORKERS,
+                  seen_cities: Optional[set] = None, failed_cities: Optional[set] = None) -> NudgeRunStats:
+    """
+    Creates a weather whisper for every guardian that wants nudges (optionally only ids start_id..end_id).
+    If heartbeat is given it's called after every committed chunk; returning False stops the run early.
+    Pass the same seen_cities/failed_cities sets to several calls to count each city only once across them.
+    """
+    stats = NudgeRunStats()
+    started = time.perf_counter()
+    seen_cities = set() if seen_cities is None else seen_cities
+    failed_cities = set() if failed_cities is None else failed_cities
+    pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="nudge-weather")
+
+    try:
+        with Session(engine) as session:
+            for chunk in iter_guardian_chunks(session, chunk_size, start_id, end_id):
+                stats.guardians_scanned += len(chunk)
+
+                # Group guardians by city so each city is fetched once per chunk (and the cache covers the rest).
+                by_city = {}
+                for guardian_id, location in chunk:
+                    by_city.setdefault(normalize_city(location), []).append((guardian_id, location))
+                cities = {key: members[0][1] for key, members in by_city.items()}
+
+                weather_by_city, failed = fetch_cities(pool, cities)
+                for key, reason in failed.items():
+                    if key not in failed_cities:
+                        print(f"Failed to fetch weather for '{cities[key]}' ({len(by_city[key])} guardians skipped): {reason}")
+                failed_cities.update(failed)
+                seen_cities.update(weather_by_city)
+
+                now = datetime.utcnow()
+                rows = [
+                    {
+                        "guardian_id": guardian_id,
+                        # Assuming a default gender for automatic nudges for now
+                        "message": services.build_recommendation(location, weather_by_city[key], "unisex"),
+                        "created_at": now,
+                    }
+                    for key, members in by_city.items() if key in weather_by_city
+                    for guardian_id, location in members
+                ]
+                created = []
+                if rows:
+                    created = session.execute(insert(models.Whisper).returning(*WHISPER_COLUMNS), rows).all()
+                    stats.whispers_written += len(rows)
+                # Committing per chunk keeps transactions short (and ends the read for this chunk too).
+                session.commit()
+                events.broker.publish([events.whisper_event(*row) for row in created])
+                if heartbeat is not None and not heartbeat():
+                    break
+    finally:
+        pool.shutdown(wait=False, cancel_futures=True)
+
+    stats.cities_fetched = len(seen_cities)
+    stats.cities_failed = len(failed_cities - seen_cities)
+    stats.wall_time_seconds = round(time.perf_counter() - started, 3)
+    return stats
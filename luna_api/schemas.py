@@ -1,8 +1,11 @@
 # File: luna_api/schemas.py
 # Reminder to self: Defines request schemas
 
+from datetime import datetime
 from sqlmodel import SQLModel
-from typing import Optional, Dict
+from typing import Optional, Dict, List
+
+import models
 
 # --- Guardian Schemas ---
 class GuardianCreate(SQLModel):
@@ -18,4 +21,13 @@ class HabitSettings(SQLModel):
 class PreferencesUpdate(SQLModel):
     location: Optional[str] = None
     enable_nudges: Optional[bool] = None
-    habits: Optional[Dict[str, HabitSettings]] = None
\ No newline at end of file
+    habits: Optional[Dict[str, HabitSettings]] = None
+
+# --- Nudge Schemas ---
+class NudgePage(SQLModel):
+    items: List[models.Whisper]
+    next_cursor: Optional[str] = None  # Pass this back as ?cursor= to get older whispers
+    unread_count: Optional[int] = None  # Only filled in when ?include_unread=true
+
+class NudgesRead(SQLModel):
+    up_to: Optional[datetime] = None  # Defaults to "everything until now"
@@ -1,22 +1,25 @@
 # File: luna_api/services.py
 
-import os
 import random
-import requests
 from fastapi import HTTPException
 
-def generate_weather_recommendation(city: str, gender: str) -> str:
+from weather import WeatherError, provider
+
+async def generate_weather_recommendation(city: str, gender: str) -> str:
     """
-    Fetches weather and generates a personalized, sassy outfit recommendation.
+    Fetches weather (through the shared cache) and generates a personalized, sassy outfit recommendation.
     """
-    api_key = os.getenv("OPENWEATHER_API_KEY")
-    weather_url = f"http://api.openweathermap.org/data/2.5/weather?q={city}&appid={api_key}&units=metric"
-
-    response = requests.get(weather_url)
-    if response.status_code != 200:
+    try:
+        weather = await provider.aget(city)
+    except WeatherError:
+        raise HTTPException(status_code=502, detail="I can't see the sky right now. Try again in a bit?")
+    if weather is None:
         raise HTTPException(status_code=404, detail=f"'{city}'? Never heard of it. Check the spelling?")
 
-    weather = response.json()
+    return build_recommendation(city, weather, gender)
+
+def build_recommendation(city: str, weather: dict, gender: str) -> str:
+    """Turns an OpenWeatherMap payload into L.U.N.A.'s outfit advice."""
     temp = weather['main']['temp']
     condition = weather['weather'][0]['main'].lower()
 
@@ -0,0 +1,242 @@
+# File: luna_api/weather.py
+# Reminder to self: This is the weather provider layer. Every OpenWeatherMap call goes through here so that
+# everyone in the same city shares one cached forecast instead of each user hitting the API on their own.
+
+import asyncio
+import threading
+import time
+from collections import OrderedDict
+from typing import Optional
+
+import httpx
+import requests
+from requests.adapters import HTTPAdapter
+
+import config
+import metrics
+
+WEATHER_URL = f"{config.OPENWEATHER_BASE_URL}/data/2.5/weather"
+
+
+class WeatherError(Exception):
+    """Raised when OpenWeatherMap can't give us an answer (network trouble, bad key, rate limit...)."""
+
+
+def normalize_city(city: str) -> str:
+    """'  new   YORK ' and 'New York' are the same place, so they should share a cache entry."""
+    return " ".join(city.split()).casefold()
+
+
+class _InFlight:
+    """One upstream fetch that other threads asking for the same city can wait on."""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result: Optional[dict] = None
+        self.error: Optional[BaseException] = None
+
+
+class WeatherProvider:
+    """
+    Bounded LRU cache of current weather per city, with a TTL, a short negative cache for unknown
+    cities and request coalescing, so concurrent misses for one city turn into a single upstream call.
+    """
+
+    def __init__(
+        self,
+        ttl_seconds: float = config.WEATHER_CACHE_TTL_SECONDS,
+        negative_ttl_seconds: float = config.WEATHER_NEGATIVE_TTL_SECONDS,
+        max_entries: int = config.WEATHER_CACHE_SIZE,
+        timeout_seconds: float = config.WEATHER_TIMEOUT_SECONDS,
+        pool_size: int = config.WEATHER_POOL_SIZE,
+        async_max_connections: int = config.WEATHER_ASYNC_MAX_CONNECTIONS,
+    ):
+        self.ttl_seconds = ttl_seconds
+        self.negative_ttl_seconds = negative_ttl_seconds
+        self.max_entries = max_entries
+        self.timeout_seconds = timeout_seconds
+        self.async_max_connections = async_max_connections
+
+        # Reminder to self: key -> (expires_at, weather or None for "city doesn't exist")
+        self._cache: "OrderedDict[str, tuple]" = OrderedDict()
+        self._inflight: dict = {}
+        self._async_inflight: dict = {}  # key -> asyncio.Task, only touched from the event loop
+        self._lock = threading.Lock()
+
+        # One pooled session means we keep TCP/TLS connections alive between calls.
+        self._http = requests.Session()
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        self._http.mount("http://", adapter)
+        self._http.mount("https://", adapter)
+        # The async client for request handlers gets created on first use, inside the event loop.
+        self._async_http: Optional[httpx.AsyncClient] = None
+
+        self.hits = 0
+        self.negative_hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self.errors = 0
+        self.evictions = 0
+
+    def _cached(self, key: str) -> tuple:
+        """(True, weather) on a fresh cache entry, (False, None) otherwise. Call with the lock held."""
+        entry = self._cache.get(key)
+        if entry is None or entry[0] <= time.monotonic():
+            return False, None
+        self._cache.move_to_end(key)
+        if entry[1] is None:
+            self.negative_hits += 1
+        else:
+            self.hits += 1
+        return True, entry[1]
+
+    def get(self, city: str) -> Optional[dict]:
+        """Returns the OpenWeatherMap payload for a city, or None if the city doesn't exist."""
+        key = normalize_city(city)
+        with self._lock:
+            hit, weather = self._cached(key)
+            if hit:
+                return weather
+
+            call = self._inflight.get(key)
+            if call is not None:
+                self.coalesced += 1
+                leader = False
+            else:
+                self.misses += 1
+                call = _InFlight()
+                self._inflight[key] = call
+                leader = True
+
+        if not leader:
+            # Someone else is already fetching this city, so just wait for their answer.
+            if not call.done.wait(self.timeout_seconds * 2):
+                raise WeatherError(f"Timed out waiting for weather for '{city}'")
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = self._fetch(key)
+        except BaseException as e:
+            call.error = e if isinstance(e, WeatherError) else WeatherError(str(e))
+            with self._lock:
+                self.errors += 1
+            raise call.error
+        else:
+            self._store(key, call.result)
+            return call.result
+        finally:
+            with self._lock:
+                self._inflight.pop(key, None)
+            call.done.set()
+
+    async def aget(self, city: str) -> Optional[dict]:
+        """Async version of get() for request handlers. Shares the same cache."""
+        key = normalize_city(city)
+        with self._lock:
+            hit, weather = self._cached(key)
+            if hit:
+                return weather
+
+            task = self._async_inflight.get(key)
+            if task is not None:
+                self.coalesced += 1
+            else:
+                self.misses += 1
+                task = asyncio.ensure_future(self._afetch_and_store(key))
+                self._async_inflight[key] = task
+                task.add_done_callback(lambda _: self._async_inflight.pop(key, None))
+
+        # shield() so one impatient client hanging up doesn't cancel the fetch everyone else is waiting on.
+        return await asyncio.shield(task)
+
+    async def _afetch_and_store(self, key: str) -> Optional[dict]:
+        try:
+            weather = await self._afetch(key)
+        except Exception as e:
+            with self._lock:
+                self.errors += 1
+            if isinstance(e, WeatherError):
+                raise
+            raise WeatherError(str(e)) from e
+        self._store(key, weather)
+        return weather
+
+    def _params(self, key: str) -> dict:
+        return {"q": key, "appid": config.OPENWEATHER_API_KEY, "units": "metric"}
+
+    def _parse(self, response) -> Optional[dict]:
+        """Works for both requests and httpx responses."""
+        if response.status_code == 404:
+            return None
+        if response.status_code != 200:
+            raise WeatherError(f"OpenWeatherMap answered with status {response.status_code}")
+        return response.json()
+
+    def _fetch(self, key: str) -> Optional[dict]:
+        started = time.perf_counter()
+        try:
+            response = self._http.get(WEATHER_URL, params=self._params(key), timeout=self.timeout_seconds)
+        except requests.RequestException as e:
+            self._record("sync", started, type(e).__name__)
+            raise WeatherError(f"Couldn't reach OpenWeatherMap: {e}") from e
+        self._record("sync", started, response.status_code)
+        return self._parse(response)
+
+    async def _afetch(self, key: str) -> Optional[dict]:
+        if self._async_http is None:
+            self._async_http = httpx.AsyncClient(
+                timeout=self.timeout_seconds,
+                limits=httpx.Limits(max_connections=self.async_max_connections, max_keepalive_connections=self.async_max_connections),
+            )
+        started = time.perf_counter()
+        try:
+            response = await self._async_http.get(WEATHER_URL, params=self._params(key))
+        except httpx.HTTPError as e:
+            self._record("async", started, type(e).__name__)
+            raise WeatherError(f"Couldn't reach OpenWeatherMap: {e}") from e
+        self._record("async", started, response.status_code)
+        return self._parse(response)
+
+    def _record(self, client: str, started: float, result):
+        """result is the HTTP status code, or the exception name when we never got a response."""
+        outcome = "ok" if result in (200, 404) else "error"
+        metrics.WEATHER_CALL_SECONDS.observe(time.perf_counter() - started, client=client, outcome=outcome)
+        if outcome == "error":
+            metrics.WEATHER_CALL_ERRORS.inc(client=client, reason=result)
+
+    async def aclose(self):
+        if self._async_http is not None:
+            await self._async_http.aclose()
+            self._async_http = None
+
+    def _store(self, key: str, weather: Optional[dict]):
+        ttl = self.ttl_seconds if weather is not None else self.negative_ttl_seconds
+        with self._lock:
+            self._cache[key] = (time.monotonic() + ttl, weather)
+            self._cache.move_to_end(key)
+            while len(self._cache) > self.max_entries:
+                self._cache.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._cache.clear()
+
+    def stats(self) -> dict:
+        """Counters so we can see how well the cache is doing."""
+        with self._lock:
+            return {
+                "size": len(self._cache),
+                "hits": self.hits,
+                "negative_hits": self.negative_hits,
+                "misses": self.misses,
+                "coalesced": self.coalesced,
+                "errors": self.errors,
+                "evictions": self.evictions,
+            }
+
+
+# Reminder to self: One shared provider for the whole app (API requests and the scheduler).
+provider = WeatherProvider()
@@ -0,0 +1,102 @@
+# File: luna_api/whispers.py
+# Reminder to self: Reading and cleaning up whispers. /nudges pages through them with a (created_at, id)
+# cursor so every page is one index range scan, and old ones get pruned in small batches.
+
+import base64
+from datetime import datetime, timedelta, timezone
+from typing import List, Optional
+
+from fastapi import HTTPException
+from sqlalchemy import and_, delete, func, or_
+from sqlmodel import Session, select
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+import config
+import models
+
+
+def encode_cursor(whisper: models.Whisper) -> str:
+    raw = f"{whisper.created_at.isoformat()}|{whisper.id}"
+    return base64.urlsafe_b64encode(raw.encode()).decode()
+
+
+def decode_cursor(cursor: str) -> tuple:
+    try:
+        created_at, whisper_id = base64.urlsafe_b64decode(cursor.encode()).decode().split("|")
+        return datetime.fromisoformat(created_at), int(whisper_id)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="That cursor doesn't look like one of mine.")
+
+
+def to_naive_utc(value: Optional[datetime]) -> Optional[datetime]:
+    """Whisper times are stored as naive UTC, so "...Z" or "+02:00" from a client gets converted to match."""
+    if value is not None and value.tzinfo is not None:
+        return value.astimezone(timezone.utc).replace(tzinfo=None)
+    return value
+
+
+async def get_page(session: AsyncSession, guardian_id: int, limit: int, cursor: Optional[str] = None,
+                   since: Optional[datetime] = None) -> tuple:
+    """
+    Returns (whispers newest-first, next_cursor). cursor continues to older whispers,
+    since only returns whispers newer than that time (handy for polling).
+    """
+    since = to_naive_utc(since)
+    query = select(models.Whisper).where(models.Whisper.guardian_id == guardian_id)
+    if cursor is not None:
+        created_at, whisper_id = decode_cursor(cursor)
+        query = query.where(or_(
+            models.Whisper.created_at < created_at,
+            and_(models.Whisper.created_at == created_at, models.Whisper.id < whisper_id),
+        ))
+    if since is not None:
+        query = query.where(models.Whisper.created_at > since)
+
+    # Fetch one extra row to find out if there's another page without a COUNT.
+    rows: List[models.Whisper] = (await session.exec(
+        query.order_by(models.Whisper.created_at.desc(), models.Whisper.id.desc()).limit(limit + 1)
+    )).all()
+    next_cursor = encode_cursor(rows[limit - 1]) if len(rows) > limit else None
+    return rows[:limit], next_cursor
+
+
+async def unread_count(session: AsyncSession, guardian_id: int) -> int:
+    marker = await session.get(models.NudgeReadMarker, guardian_id)
+    query = select(func.count()).select_from(models.Whisper).where(models.Whisper.guardian_id == guardian_id)
+    if marker is not None:
+        query = query.where(models.Whisper.created_at > marker.last_read_at)
+    return (await session.exec(query)).one()
+
+
+async def mark_read(session: AsyncSession, guardian_id: int, up_to: Optional[datetime] = None) -> datetime:
+    """Moves the guardian's read marker forward (never backwards). Doesn't commit."""
+    up_to = to_naive_utc(up_to) or datetime.utcnow()
+    marker = await session.get(models.NudgeReadMarker, guardian_id)
+    if marker is None:
+        marker = models.NudgeReadMarker(guardian_id=guardian_id, last_read_at=up_to)
+    elif up_to > marker.last_read_at:
+        marker.last_read_at = up_to
+    session.add(marker)
+    return marker.last_read_at
+
+
+def prune_old_whispers(engine, retention_days: float = config.WHISPER_RETENTION_DAYS,
+                       batch_size: int = config.WHISPER_PRUNE_BATCH_SIZE) -> int:
+    """
+    Deletes whispers older than the retention window, batch_size rows per transaction,
+    so we never hold a giant lock on the table. Returns how many rows were deleted.
+    """
+    if retention_days <= 0:
+        return 0
+    cutoff = datetime.utcnow() - timedelta(days=retention_days)
+    deleted = 0
+    with Session(engine) as session:
+        while True:
+            ids = session.exec(
+                select(models.Whisper.id).where(models.Whisper.created_at < cutoff).limit(batch_size)
+            ).all()
+            if not ids:
+                return deleted
+            session.execute(delete(models.Whisper).where(models.Whisper.id.in_(ids)))
+            session.commit()
+            deleted += len(ids)
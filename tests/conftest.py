@@ -0,0 +1,22 @@
+# File: tests/conftest.py
+# Reminder to self: The API modules import each other flat (import config, import models...), like they do
+# inside the container, so put luna_api on the path. Every test gets its own SQLite file.
+
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "luna_api"))
+os.environ.setdefault("DATABASE_URL", "sqlite://")
+
+import pytest  # noqa: E402
+from sqlmodel import SQLModel, create_engine  # noqa: E402
+
+import models  # noqa: E402, F401  (registers the tables)
+
+
+@pytest.fixture
+def engine(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'luna.db'}")
+    SQLModel.metadata.create_all(engine)
+    yield engine
+    engine.dispose()
@@ -0,0 +1,137 @@
+# File: tests/test_coordination.py
+
+import threading
+from datetime import datetime
+
+import pytest
+from sqlalchemy import func
+from sqlalchemy.exc import IntegrityError
+from sqlmodel import Session, select
+
+import coordination
+import models
+import weather
+
+SLOT = 1000
+
+
+def add_guardians(engine, count, **fields):
+    with Session(engine) as session:
+        for i in range(count):
+            values = {"email": f"g{i}@luna.test", "hashed_password": "x", "location": "Paris", **fields}
+            session.add(models.Guardian(**values))
+        session.commit()
+
+
+def set_nudges(engine, guardian_id, enabled):
+    with Session(engine) as session:
+        guardian = session.get(models.Guardian, guardian_id)
+        guardian.enable_nudges = enabled
+        session.add(guardian)
+        session.commit()
+
+
+def unit_ranges(engine):
+    with Session(engine) as session:
+        units = session.exec(select(models.NudgeWorkUnit).order_by(models.NudgeWorkUnit.start_id)).all()
+        return [(unit.start_id, unit.end_id) for unit in units]
+
+
+def test_plan_units_uses_fixed_buckets(engine):
+    add_guardians(engine, 25)
+    set_nudges(engine, 1, False)  # min id is now 2, but the buckets shouldn't move
+
+    with Session(engine) as session:
+        assert coordination.plan_units(session, SLOT, unit_size=10) == 3
+        assert coordination.plan_units(session, SLOT, unit_size=10) == 0
+    assert unit_ranges(engine) == [(1, 10), (11, 20), (21, 30)]
+
+
+def test_racing_plan_with_different_bounds_is_rejected(engine):
+    add_guardians(engine, 25)
+    set_nudges(engine, 1, False)
+    with Session(engine) as session:
+        coordination.plan_units(session, SLOT, unit_size=10)
+
+    # A second replica that read min/max after guardian 1 changed got past the "already planned" check.
+    set_nudges(engine, 1, True)
+    with Session(engine) as session:
+        session.add_all(coordination.bucket_units(SLOT, 1, 25, 10))
+        with pytest.raises(IntegrityError):
+            session.commit()
+    assert unit_ranges(engine) == [(1, 10), (11, 20), (21, 30)]
+
+
+def test_claims_are_exclusive(engine):
+    add_guardians(engine, 25)
+    with Session(engine) as session:
+        coordination.plan_units(session, SLOT, unit_size=10)
+        claimed = [coordination.claim_unit(session, SLOT, "w1") for _ in range(3)]
+        assert len({unit.id for unit in claimed}) == 3
+        assert coordination.claim_unit(session, SLOT, "w2") is None
+
+
+def test_expired_lease_gets_reclaimed(engine):
+    add_guardians(engine, 5)
+    with Session(engine) as session:
+        coordination.plan_units(session, SLOT, unit_size=10)
+        first = coordination.claim_unit(session, SLOT, "w1", lease_seconds=-1)  # Lease is over right away
+        second = coordination.claim_unit(session, SLOT, "w2")
+        assert second.id == first.id
+        assert second.leased_by == "w2"
+        assert second.attempts == 2
+
+
+def test_unfinished_unit_from_previous_run_gets_reclaimed(engine):
+    add_guardians(engine, 5)
+    with Session(engine) as session:
+        coordination.plan_units(session, SLOT, unit_size=10)
+        coordination.claim_unit(session, SLOT, "w1", lease_seconds=-1)
+        unit = coordination.claim_unit(session, SLOT + 1, "w2")
+        assert unit is not None and unit.run_slot == SLOT
+
+
+def test_complete_after_losing_the_lease_fails(engine):
+    add_guardians(engine, 5)
+    with Session(engine) as session:
+        coordination.plan_units(session, SLOT, unit_size=10)
+        unit = coordination.claim_unit(session, SLOT, "w1", lease_seconds=-1)
+        coordination.claim_unit(session, SLOT, "w2")
+
+        assert not coordination.renew_lease(session, unit.id, "w1")
+        assert not coordination.complete_unit(session, unit.id, "w1")
+        assert coordination.complete_unit(session, unit.id, "w2")
+        assert coordination.claim_unit(session, SLOT, "w1") is None
+
+
+def test_workers_share_a_run_without_duplicates(engine, monkeypatch):
+    add_guardians(engine, 60)
+    with Session(engine) as session:
+        for guardian in session.exec(select(models.Guardian).where(models.Guardian.id % 2 == 0)).all():
+            guardian.location = "London"
+            session.add(guardian)
+        session.commit()
+
+    monkeypatch.setattr(coordination.config, "NUDGE_UNIT_SIZE", 7)
+    monkeypatch.setattr(coordination.plan_units, "__defaults__", (7,))
+    monkeypatch.setattr(weather.provider, "_fetch", lambda key: {"main": {"temp": 18}, "weather": [{"main": "Clouds"}]})
+    weather.provider.clear()
+
+    now = datetime.utcnow()
+    results = []
+
+    def work(worker_id):
+        results.append(coordination.run_coordinated_nudge_job(engine, worker_id=worker_id, now=now))
+
+    threads = [threading.Thread(target=work, args=(f"w{i}",)) for i in range(3)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    with Session(engine) as session:
+        assert session.exec(select(func.count(models.Whisper.id))).one() == 60
+        assert session.exec(select(func.count(func.distinct(models.Whisper.guardian_id)))).one() == 60
+    assert sum(result.units_processed for result in results) == 9
+    # Paris and London turn up in every unit, but each worker only counts them once.
+    assert all(result.cities_fetched <= 2 for result in results)